@@ -1,43 +1,112 @@
+import os
 import pygame
 import random
 from os import listdir
 from os.path import isfile, join
-
-# Initialize pygame
-pygame.init()
+from telemetry import TelemetryEmitter, parse_address, CAUSE_ENEMY, CAUSE_FIRE, CAUSE_FALL
+from streaming import AssetLoader, ChunkStreamer, LevelSource
+from render import Renderer
+from skins import SkinRegistry
+from spawning import EntityPool, Spawner
+from endless import EndlessSource
+from segments import SegmentIndex
+from rewind import RewindBuffer
+from audio import SoundBank
+from stats import RunStats, StatsStore
+from devreload import LevelWatcher, diff_tiles
+from governor import QualityGovernor
+from frames import (make_frame, flip_frame, compile_animations, Animated, LEFT, RIGHT, IDLE, RUN, JUMP,
+                    DOUBLE_JUMP, FALL, HIT, PLAYER_STATES, DIRECTIONS, OFF, ON, FIRE_STATES, WALK)
+import level1
 
 # Game settings
-pygame.display.set_caption("Platformer")
 WIDTH, HEIGHT = 1000, 800
 FPS = 60
 PLAYER_VEL = 5
-ENEMY_VEL = 3  # Speed of the enemies
-
-# Create the game window
-window = pygame.display.set_mode((WIDTH, HEIGHT))
-
-
-# Function to flip sprite images horizontally
-def flip(sprites):
-    return [pygame.transform.flip(sprite, True, False) for sprite in sprites]
+ENEMY_VEL = 6  # Speed of the enemies
+MAX_ENEMIES = 24  # Enemies that can be active at the same time
+REWIND_SECONDS = 10  # How far back backspace can rewind
+REWIND_ON_DEATH = 2  # Seconds to go back when dying, 0 shows the game over screen
+MAX_REWIND_TRAPS = 16  # Fire traps whose animation is kept in rewind snapshots
+FALL_LIMIT = HEIGHT + 200  # Falling below this, e.g. into a pit, is death
+# collide() looks this far ahead and stops the player before the hitboxes touch,
+# so a fire trap this close counts as touching it
+FIRE_REACH = PLAYER_VEL * 2
+# Sprites are drawn at 2x. With native resolution they stay at 1x, the world is
+# drawn into a 500x400 frame and scaled up to the window once per frame.
+PIXEL_SCALE = 2
+NATIVE_RESOLUTION = os.environ.get("PLATFORMER_NATIVE_RESOLUTION") == "1"
+ASSET_SCALE = 1 if NATIVE_RESOLUTION else PIXEL_SCALE  # Scale images are stored at
+MASK_SCALE = PIXEL_SCALE // ASSET_SCALE  # World pixels per image pixel
+# Play an endless generated level instead of level 1, the seed picks the world
+ENDLESS_SEED = os.environ.get("PLATFORMER_ENDLESS_SEED")
+PLAYER_SKIN = "NinjaFrog"  # Character picked when the start screen opens
+SKIN_MEMORY_BUDGET = 16 * 1024 * 1024  # Bytes of character frames kept loaded
+# Send telemetry to a collector, e.g. "udp:127.0.0.1:9999" or "unix:/tmp/platformer.sock"
+TELEMETRY_ADDRESS = os.environ.get("PLATFORMER_TELEMETRY")
+STATS_DATABASE = "stats.db"  # Where finished runs are stored
+# Reload level1.py while playing when it is saved
+DEV_RELOAD = os.environ.get("PLATFORMER_DEV") == "1"
+# Record the game to CAPTURE_FOLDER, "png" for an image sequence or "raw" for rgb24 video.
+# F12 saves a screenshot there, also when not recording.
+CAPTURE_MODE = os.environ.get("PLATFORMER_CAPTURE")
+CAPTURE_FOLDER = "captures"
+CAPTURE_EVERY = 1  # Record every n-th drawn frame, 2 records at 30 fps
+# Lower the quality step by step when the game can not keep up with FPS
+ADAPTIVE_QUALITY = True
+ANIMATION_DELAY = 3  # Frames each animation image is shown at full quality
+BACKGROUND_COLOR = (188, 203, 213)  # Drawn instead of the background when quality is lowered
+
+# The game window, created by init_display() or Game() and not on import
+window = None
+
+# Particles need NumPy, which is only imported when a game starts
+particles = None
+
+# Images are decoded on worker threads and cached, see streaming.py
+assets = AssetLoader()
+sprite_sheet_cache = {}
+scaled_image_cache = {}
+block_cache = {}
+animation_cache = {}
+
+
+# Function to flip animation frames horizontally
+def flip(frames):
+    return [flip_frame(frame, MASK_SCALE) for frame in frames]
+
+
+# Function to scale a 1x image to the scale assets are stored at
+def scale_asset(surface):
+    if ASSET_SCALE == 1:
+        return surface
+    return pygame.transform.scale2x(surface)
+
+
+# Function to get the world rect of an image stored at ASSET_SCALE
+def world_rect(surface, x, y):
+    width, height = surface.get_size()
+    return pygame.Rect(x, y, width * MASK_SCALE, height * MASK_SCALE)
+
+
+# Function to load sprite sheets, every sheet is only cut once
+def load_sprite_sheets(dir1, dir2, width, height, direction=False):
+    key = (dir1, dir2, width, height, direction)
+    if key not in sprite_sheet_cache:
+        sprite_sheet_cache[key] = cut_sprite_sheets(dir1, dir2, width, height, direction)
+    return sprite_sheet_cache[key]
 
 
-# Function to load sprite sheets
-def load_sprite_sheets(dir1, dir2, width, height, direction=False):
+def cut_sprite_sheets(dir1, dir2, width, height, direction):
     path = join("assets", dir1, dir2)
     images = [f for f in listdir(path) if isfile(join(path, f))]
+    for image in images:
+        assets.prefetch(join(path, image))
 
     all_sprites = {}
 
     for image in images:
-        sprite_sheet = pygame.image.load(join(path, image)).convert_alpha()
-
-        sprites = []
-        for i in range(sprite_sheet.get_width() // width):
-            surface = pygame.Surface((width, height), pygame.SRCALPHA, 32)
-            rect = pygame.Rect(i * width, 0, width, height)
-            surface.blit(sprite_sheet, (0, 0), rect)
-            sprites.append(pygame.transform.scale2x(surface))
+        sprites = cut_sprite_sheet(join(path, image), width, height)
 
         if direction:
             all_sprites[image.replace(".png", "") + "_right"] = sprites
@@ -48,30 +117,98 @@ def load_sprite_sheets(dir1, dir2, width, height, direction=False):
     return all_sprites
 
 
-# Function to get block image for terrain
+# Function to cut one sprite sheet into frames, with their hitboxes
+def cut_sprite_sheet(path, width, height):
+    sprite_sheet = assets.image(path)
+
+    sprites = []
+    for i in range(sprite_sheet.get_width() // width):
+        surface = pygame.Surface((width, height), pygame.SRCALPHA, 32)
+        rect = pygame.Rect(i * width, 0, width, height)
+        surface.blit(sprite_sheet, (0, 0), rect)
+        sprites.append(make_frame(scale_asset(surface), MASK_SCALE))
+
+    return sprites
+
+
+# Function to load a character animation, the whole sheet is not kept around
+def load_character_sheet(path):
+    sprites = cut_sprite_sheet(path, 32, 32)
+    assets.release(path)
+    return sprites
+
+
+# Character animations are loaded when they are first shown
+skins = SkinRegistry(join("assets", "MainCharacters"), load_character_sheet, flip, SKIN_MEMORY_BUDGET)
+
+
+# Function to get block image for terrain, shared by every block of that size
 def get_block(size):
-    path = join("assets", "Terrain", "MosterdGras.png")
-    image = pygame.image.load(path).convert_alpha()
-    surface = pygame.Surface((size, size), pygame.SRCALPHA, 32)
-    rect = pygame.Rect(96, 0, size, size)
-    surface.blit(image, (0, 0), rect)
-    return pygame.transform.scale2x(image)
+    if size not in block_cache:
+        image = assets.image(join("assets", "Terrain", "MosterdGras.png"))
+        surface = pygame.Surface((size // MASK_SCALE, size // MASK_SCALE), pygame.SRCALPHA, 32)
+        surface.blit(scale_asset(image), (0, 0))
+        block_cache[size] = make_frame(surface, MASK_SCALE)
+    return block_cache[size]
+
+
+# Function to load an image scaled to a fixed size, cached per size
+def get_scaled_image(path, width, height):
+    key = (path, width, height)
+    if key not in scaled_image_cache:
+        image = pygame.transform.scale(assets.image(path), (width // MASK_SCALE, height // MASK_SCALE))
+        scaled_image_cache[key] = make_frame(image, MASK_SCALE)
+    return scaled_image_cache[key]
+
+
+# Function to get the animation table of fire traps of a size
+def get_fire_animations(width, height):
+    key = ("fire", width, height)
+    if key not in animation_cache:
+        sheets = load_sprite_sheets("Traps", "Fire", width, height)
+        animation_cache[key] = compile_animations(lambda name, direction: sheets[name], FIRE_STATES)
+    return animation_cache[key]
+
+
+# Function to get the animation table of enemies of a size, the image faces right
+def get_enemy_animations(width, height):
+    key = ("enemy", width, height)
+    if key not in animation_cache:
+        frames = [get_scaled_image(join("assets", "Enemies", "VoetenGoomba.png"), width, height)]
+        animation_cache[key] = compile_animations(
+            lambda name, direction: frames if direction == "right" else flip(frames), ("walk",))
+    return animation_cache[key]
+
+
+# Function to give all frames of an animation the lowest feet of any of them.
+# Landing lines up the hitbox bottom with the floor, if it changed with every
+# frame the next frame would sink into the floor and the floor would block walking.
+def standing_frames(frames):
+    foot = max(frame.hitbox.bottom for frame in frames)
+    return tuple(frame._replace(hitbox=pygame.Rect(frame.hitbox.x, frame.hitbox.y, frame.hitbox.width,
+                                                   foot - frame.hitbox.y))
+                 for frame in frames)
 
 
 # Player class with movement, animations, etc.
-class Player(pygame.sprite.Sprite):
+class Player(pygame.sprite.Sprite, Animated):
     COLOR = (255, 0, 0)
     GRAVITY = 1
-    SPRITES = load_sprite_sheets("MainCharacters", "NinjaFrog", 32, 32, True)
-    ANIMATION_DELAY = 3
+    ANIMATION_DELAY = ANIMATION_DELAY
 
-    def __init__(self, x, y, width, height):
+    def __init__(self, x, y, width, height, skin=PLAYER_SKIN):
         super().__init__()
+        self.skin = skin
         self.rect = pygame.Rect(x, y, width, height)
         self.x_vel = 0
         self.y_vel = 0
         self.mask = None
-        self.direction = "left"
+        self.box = pygame.Rect(0, 0, width, height)
+        self.irregular = False
+        self.state = IDLE
+        self.facing = LEFT
+        self.current_frames = None
+        self.frames_state = self.frames_facing = None
         self.animation_count = 0
         self.fall_count = 0
         self.jump_count = 0
@@ -94,15 +231,11 @@ class Player(pygame.sprite.Sprite):
 
     def move_left(self, vel):
         self.x_vel = -vel
-        if self.direction != "left":
-            self.direction = "left"
-            self.animation_count = 0
+        self.set_animation(self.state, LEFT)
 
     def move_right(self, vel):
         self.x_vel = vel
-        if self.direction != "right":
-            self.direction = "right"
-            self.animation_count = 0
+        self.set_animation(self.state, RIGHT)
 
     def loop(self, fps):
         self.y_vel += min(1, (self.fall_count / fps) * self.GRAVITY)
@@ -127,29 +260,41 @@ class Player(pygame.sprite.Sprite):
         self.y_vel *= -1
 
     def update_sprite(self):
-        sprite_sheet = "idle"
+        state = IDLE
         if self.hit:
-            sprite_sheet = "hit"
+            state = HIT
         elif self.y_vel < 0:
             if self.jump_count == 1:
-                sprite_sheet = "jump"
+                state = JUMP
             elif self.jump_count == 2:
-                sprite_sheet = "double_jump"
+                state = DOUBLE_JUMP
         elif self.y_vel > self.GRAVITY * 2:
-            sprite_sheet = "fall"
+            state = FALL
         elif self.x_vel != 0:
-            sprite_sheet = "run"
+            state = RUN
 
-        sprite_sheet_name = sprite_sheet + "_" + self.direction
-        sprites = self.SPRITES[sprite_sheet_name]
-        sprite_index = (self.animation_count // self.ANIMATION_DELAY) % len(sprites)
-        self.sprite = sprites[sprite_index]
-        self.animation_count += 1
+        self.set_animation(state, self.facing)
+        self.sprite, self.mask, self.box, self.irregular = self.next_frame()
         self.update()
 
+    # The frames come from the skin registry instead of a table of our own, so
+    # they are only loaded when shown and the registry can free them again.
+    # Only the animation that is playing is kept here.
+    def frames(self, state, facing):
+        if state != self.frames_state or facing != self.frames_facing:
+            self.current_frames = standing_frames(
+                skins.get(self.skin, PLAYER_STATES[state], DIRECTIONS[facing]))
+            self.frames_state = state
+            self.frames_facing = facing
+        return self.current_frames
+
     def update(self):
-        self.rect = self.sprite.get_rect(topleft=(self.rect.x, self.rect.y))
-        self.mask = pygame.mask.from_surface(self.sprite)
+        self.rect = world_rect(self.sprite, self.rect.x, self.rect.y)
+
+    # The tight box around the pixels of the current frame, in world pixels
+    @property
+    def hitbox(self):
+        return self.box.move(self.rect.x, self.rect.y)
 
     def draw(self, win, offset_x):
         win.blit(self.sprite, (self.rect.x - offset_x, self.rect.y))
@@ -164,6 +309,16 @@ class Object(pygame.sprite.Sprite):
         self.width = width
         self.height = height
         self.name = name
+        self.box = pygame.Rect(0, 0, width, height)
+        self.irregular = False
+
+    def set_frame(self, frame):
+        self.image, self.mask, self.box, self.irregular = frame
+
+    # The tight box around the pixels of the current image, in world pixels
+    @property
+    def hitbox(self):
+        return self.box.move(self.rect.x, self.rect.y)
 
     def draw(self, win, offset_x):
         win.blit(self.image, (self.rect.x - offset_x, self.rect.y))
@@ -173,110 +328,149 @@ class Object(pygame.sprite.Sprite):
 class Block(Object):
     def __init__(self, x, y, size):
         super().__init__(x, y, size, size)
-        block = get_block(size)
-        self.image.blit(block, (0, 0))
-        self.mask = pygame.mask.from_surface(self.image)
+        self.set_frame(get_block(size))
 
 
 # Fire trap class for hazards
-class Fire(Object):
-    ANIMATION_DELAY = 3
+class Fire(Object, Animated):
+    ANIMATION_DELAY = ANIMATION_DELAY
 
     def __init__(self, x, y, width, height):
         super().__init__(x, y, width, height, "fire")
-        self.fire = load_sprite_sheets("Traps", "Fire", width, height)
-        self.image = self.fire["off"][0]
-        self.mask = pygame.mask.from_surface(self.image)
+        self.animations = get_fire_animations(width, height)
+        self.state = OFF
+        self.facing = RIGHT
         self.animation_count = 0
-        self.animation_name = "off"
+        self.set_frame(self.animations[OFF][RIGHT][0])
 
     def on(self):
-        self.animation_name = "on"
+        self.set_animation(ON, self.facing)
 
     def off(self):
-        self.animation_name = "off"
+        self.set_animation(OFF, self.facing)
 
     def loop(self):
-        sprites = self.fire[self.animation_name]
-        sprite_index = (self.animation_count // self.ANIMATION_DELAY) % len(sprites)
-        self.image = sprites[sprite_index]
-        self.animation_count += 1
-
-        self.rect = self.image.get_rect(topleft=(self.rect.x, self.rect.y))
-        self.mask = pygame.mask.from_surface(self.image)
-
-        if self.animation_count // self.ANIMATION_DELAY > len(sprites):
-            self.animation_count = 0
+        self.set_frame(self.next_frame())
+        self.rect = world_rect(self.image, self.rect.x, self.rect.y)
 
 # Finish flag class
 class Flag(Object):
     def __init__(self, x, y, width, height):
         super().__init__(x, y, width, height, "finish")
-        self.image = pygame.image.load(join("assets", "Finish", "FinishLine.png")).convert_alpha()
-        self.image = pygame.transform.scale(self.image, (width, height))
-        self.mask = pygame.mask.from_surface(self.image)
+        self.set_frame(get_scaled_image(join("assets", "Finish", "FinishLine.png"), width, height))
 
     def draw(self, win, offset_x):
         super().draw(win, offset_x)
 
 
 # Moving enemy class
-class MovingEnemy(Object):
+class MovingEnemy(Object, Animated):
+    ANIMATION_DELAY = ANIMATION_DELAY
+
     def __init__(self, x, y, width, height, speed):
         super().__init__(x, y, width, height, "enemy")
-        self.image = pygame.image.load(join("assets", "Enemies", "VoetenGoomba.png")).convert_alpha()
-        self.image = pygame.transform.scale(self.image, (width, height))
-        self.mask = pygame.mask.from_surface(self.image)
+        self.animations = get_enemy_animations(width, height)
+        self.state = WALK
+        self.animation_count = 0
+        self.facing = RIGHT
         self.speed = speed
-        self.direction = random.choice([-1, 1])  # Enemy moves left or right randomly
+        self.turn(random.choice([-1, 1]))  # Enemy moves left or right randomly
+        self.left = 0
+        self.right = WIDTH - width
+
+    # Puts a pooled enemy back at a spawn point
+    def reset(self, x, y):
+        self.rect.topleft = (x, y)
+        self.turn(random.choice([-1, 1]))
+
+    # The walk animation has one frame, so the image only changes when turning around
+    def turn(self, direction):
+        self.direction = direction
+        self.set_animation(WALK, RIGHT if direction > 0 else LEFT)
+        self.set_frame(self.next_frame())
+
+    # Lets the enemy walk between the edges of a segment, or stand still without one
+    def patrol(self, segment):
+        if segment:
+            self.left, self.right = segment[0], segment[1] - self.width
+        else:
+            self.left = self.right = self.rect.x
 
     def move(self):
         self.rect.x += self.direction * self.speed
-        if self.rect.x <= 0 or self.rect.x >= WIDTH - self.width:
-            self.direction *= -1
+        if self.rect.x <= self.left:
+            self.rect.x = self.left
+            if self.direction != 1:
+                self.turn(1)
+        elif self.rect.x >= self.right:
+            self.rect.x = self.right
+            if self.direction != -1:
+                self.turn(-1)
 
     def draw(self, win, offset_x):
         super().draw(win, offset_x)
-        self.move()
 
 
 # Function to get background images
 def get_background(name):
-    image = pygame.image.load(join("assets", "Background", name))
+    image = pygame.image.load(join("assets", "Background", name)).convert()
+    if NATIVE_RESOLUTION:
+        # The background is not scaled up, so it has to shrink to stay the same size
+        image = pygame.transform.scale(image, (image.get_width() // PIXEL_SCALE,
+                                               image.get_height() // PIXEL_SCALE))
     _, _, width, height = image.get_rect()
     tiles = []
 
-    for i in range(WIDTH // width + 1):
-        for j in range(HEIGHT // height + 1):
+    for i in range(WIDTH // MASK_SCALE // width + 1):
+        for j in range(HEIGHT // MASK_SCALE // height + 1):
             pos = (i * width, j * height)
             tiles.append(pos)
 
     return tiles, image
 
 
-# Function to draw everything in the game (background, objects, player)
-def draw(window, background, bg_image, player, objects, offset_x):
-    for tile in background:
-        window.blit(bg_image, tile)
+# Function to draw everything in the game (background, level, moving objects, player, particles)
+def draw(window, renderer, player, moving_objects, particle_system, offset_x, background=True):
+    target = renderer.target(window)
+    if background:
+        renderer.draw_background(target)
+    else:
+        target.fill(BACKGROUND_COLOR)
+    renderer.draw_static(target, offset_x)
 
-    for obj in objects:
-        obj.draw(window, offset_x)
-
-    player.draw(window, offset_x)
+    for obj in moving_objects:
+        renderer.add_dynamic(obj.image, obj.rect.x, obj.rect.y, offset_x)
+    renderer.add_dynamic(player.sprite, player.rect.x, player.rect.y, offset_x)
+    renderer.draw_dynamic(target)
+    if particle_system:
+        particle_system.draw(target, offset_x)
 
+    renderer.present(window)
     pygame.display.update()
 
 
+# Function to check collision between two objects. The tight hitboxes decide,
+# only when one of the frames is irregular the masks are checked pixel by pixel.
+# The masks are at ASSET_SCALE, so the offset between the rects is converted to mask pixels.
+def collide_mask(a, b):
+    if not a.hitbox.colliderect(b.hitbox):
+        return None
+    if not (a.irregular or b.irregular):
+        return True
+    offset = ((b.rect.x - a.rect.x) // MASK_SCALE, (b.rect.y - a.rect.y) // MASK_SCALE)
+    return a.mask.overlap(b.mask, offset)
+
+
 # Collision handling
 def handle_vertical_collision(player, objects, dy):
     collided_objects = []
     for obj in objects:
-        if pygame.sprite.collide_mask(player, obj):
+        if collide_mask(player, obj):
             if dy > 0:
-                player.rect.bottom = obj.rect.top
+                player.rect.y += obj.hitbox.top - player.hitbox.bottom
                 player.landed()
             elif dy < 0:
-                player.rect.top = obj.rect.bottom
+                player.rect.y += obj.hitbox.bottom - player.hitbox.top
                 player.hit_head()
 
             collided_objects.append(obj)
@@ -284,16 +478,18 @@ def handle_vertical_collision(player, objects, dy):
     return collided_objects
 
 
+# Function to find the first object the player would walk into. It looks 1 pixel
+# higher, so the floor the player has sunk into by gravity is not a wall.
 def collide(player, objects, dx):
-    player.move(dx, 0)
+    player.move(dx, -1)
     player.update()
     collided_object = None
     for obj in objects:
-        if pygame.sprite.collide_mask(player, obj):
+        if collide_mask(player, obj):
             collided_object = obj
             break
 
-    player.move(-dx, 0)
+    player.move(-dx, 1)
     player.update()
     return collided_object
 
@@ -319,8 +515,99 @@ def handle_move(player, objects):
             player.make_hit()
 
 
-# Start screen for the game
-def start_screen(window):
+# Function to initialize pygame and open the game window, only the first call does anything
+def init_display(headless=False):
+    global window
+    if window is None:
+        if headless:
+            os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+            os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+        pygame.mixer.pre_init(44100, -16, 2, 512)  # Small buffer so sounds start right away
+        pygame.init()
+        pygame.display.set_caption("Platformer")
+        window = pygame.display.set_mode((WIDTH, HEIGHT))
+    return window
+
+
+# Function to import the particle module, returns None when NumPy is not installed
+def load_particles():
+    global particles
+    if particles is None:
+        try:
+            import particles as particle_module
+        except ImportError:
+            return None
+        particles = particle_module
+    return particles
+
+
+# The game as an object, so other code can import this module without a window
+# popping up and start a game when it wants to
+class Game:
+    def __init__(self, headless=False):
+        self.window = init_display(headless)
+
+    def run(self):
+        main(self.window)
+
+
+# Telemetry emitter shared by every run, created on first use
+telemetry = None
+
+
+def get_telemetry():
+    global telemetry
+    if telemetry is None and TELEMETRY_ADDRESS:
+        telemetry = TelemetryEmitter(parse_address(TELEMETRY_ADDRESS))
+    return telemetry
+
+
+# Sound effects, decoded once for every run
+sounds = None
+
+
+def get_sounds():
+    global sounds
+    if sounds is None:
+        sounds = SoundBank()
+    return sounds
+
+
+# Stats database writer, started on first use
+stats = None
+
+
+def get_stats():
+    global stats
+    if stats is None:
+        stats = StatsStore(STATS_DATABASE)
+    return stats
+
+
+# Frame recorder, needs NumPy like the particles
+frame_capture = None
+
+
+# Function to get the recorder, made when recording or on the first screenshot.
+# Only taking screenshots needs a single buffer.
+def get_frame_capture():
+    global frame_capture
+    if frame_capture is None:
+        try:
+            from capture import FrameCapture
+        except ImportError:
+            return None
+        frame_capture = FrameCapture(window.get_size(), CAPTURE_FOLDER, CAPTURE_MODE,
+                                     buffers=8 if CAPTURE_MODE else 1, every=CAPTURE_EVERY)
+    return frame_capture
+
+
+# Start screen for the game, the arrow keys pick a character
+def start_screen(window, skin=PLAYER_SKIN):
+    skin_names = skins.names()
+    if skin not in skin_names:
+        skin = skin_names[0]
+
     window.fill((0, 0, 0))  # Black background
     font = pygame.font.SysFont("comicsans", 100)
     text = font.render("Ninja Frog", True, (255, 0, 0))
@@ -329,6 +616,7 @@ def start_screen(window):
     font_small = pygame.font.SysFont("comicsans", 50)
     instructions = font_small.render("Press any key to start", True, (255, 255, 255))
     window.blit(instructions, (WIDTH // 2 - instructions.get_width() // 2, HEIGHT // 2))
+    character = font_small.render("< " + skin + " >", True, (255, 255, 255))
     
     clock = pygame.time.Clock()
     color_toggle = True
@@ -339,13 +627,19 @@ def start_screen(window):
                 pygame.quit()
                 exit()
             if event.type == pygame.KEYDOWN:
-                return
+                if event.key in (pygame.K_LEFT, pygame.K_RIGHT):
+                    step = 1 if event.key == pygame.K_RIGHT else -1
+                    skin = skin_names[(skin_names.index(skin) + step) % len(skin_names)]
+                    character = font_small.render("< " + skin + " >", True, (255, 255, 255))
+                else:
+                    return skin
 
         color_toggle = not color_toggle
         text = font.render("Ninja Frog", True, (0, 255, 0) if color_toggle else (255, 0, 0))
         window.fill((0, 0, 0))  # Clear screen
         window.blit(text, text_rect)
         window.blit(instructions, (WIDTH // 2 - instructions.get_width() // 2, HEIGHT // 2))
+        window.blit(character, (WIDTH // 2 - character.get_width() // 2, HEIGHT * 2 // 3))
         pygame.display.update()
         clock.tick(2)  # Flashing effect
 
@@ -391,139 +685,203 @@ def you_win(window):
                 waiting = False
                 return True  # Restart the game
 
+# Function to turn a level module into a list of ("kind", x, y) tiles
+def load_level(level, block_size):
+    tiles = []
+    for column in level.FLOOR:
+        if column not in level.HOLES:
+            tiles.append(("block", column * block_size, HEIGHT - block_size))
+    for column, row in level.PLATFORMS:
+        tiles.append(("block", column * block_size, HEIGHT - block_size * row))
+    for x in level.FIRES:
+        tiles.append(("fire", x, HEIGHT - block_size - 64))
+    tiles.append(("flag", level.FLAG, HEIGHT - block_size - 100))
+    return tiles
+
+
+# Function to get the enemy spawn points of a level module
+def load_spawn_points(level, block_size):
+    return [(x, HEIGHT - block_size - 32) for x in level.ENEMIES]
+
+
+# Function to create the game objects for a list of tiles, runs on a chunk worker
+def build_objects(tiles, block_size):
+    objects = []
+    for kind, x, y in tiles:
+        if kind == "block":
+            objects.append(Block(x, y, block_size))
+        elif kind == "fire":
+            fire_trap = Fire(x, y, 16, 32)
+            fire_trap.on()
+            objects.append(fire_trap)
+        elif kind == "flag":
+            objects.append(Flag(x, y, 50, 100))
+    return objects
+
+
+# Function to get the level tile an object was built from
+def tile_of(obj):
+    if obj.name == "fire":
+        return ("fire", obj.rect.x, obj.rect.y)
+    if obj.name == "finish":
+        return ("flag", obj.rect.x, obj.rect.y)
+    return ("block", obj.rect.x, obj.rect.y)
+
+
 # Main game loop function
 def main(window):
-    start_screen(window)  # Show the start screen before starting the game
+    block_size = 96
+    chunk_width = block_size * 8
+
+    watcher = None
+    if ENDLESS_SEED is not None:
+        source = EndlessSource(int(ENDLESS_SEED), block_size, HEIGHT)
+        level_name = "endless-" + ENDLESS_SEED
+    else:
+        level_name = "level1"
+        level_tiles = load_level(level1, block_size)
+        source = LevelSource(level_tiles, chunk_width, load_spawn_points(level1, block_size))
+        if DEV_RELOAD:
+            watcher = LevelWatcher(level1.__file__)
+
+    # Start building the level in the background while the start screen is shown
+    streamer = ChunkStreamer(source, lambda tiles: build_objects(tiles, block_size), source.chunk_width)
+    streamer.request_view(0, WIDTH)
+
+    skin = start_screen(window)  # Show the start screen before starting the game
 
     clock = pygame.time.Clock()
     background, bg_image = get_background("Blue.png")
-
-    block_size = 96
+    renderer = Renderer(WIDTH, HEIGHT, MASK_SCALE)
+    renderer.set_background(bg_image, background)
 
     # Create player and objects
-    player = Player(100, 100, 50, 50)
-    fire_trap1 = Fire(300, HEIGHT - block_size - 64, 16, 32)
-    fire_trap1.on()
-    fire_hits = 0
-    fire_trap2 = Fire(650, HEIGHT - block_size - 64, 16, 32)
-    fire_trap2.on()
-    fire_hits = 0
-    fire_trap3 = Fire(1500, HEIGHT - block_size - 64, 16, 32)
-    fire_trap3.on()
-    fire_hits = 0
-    fire_trap4 = Fire(1950, HEIGHT - block_size - 64, 16, 32)
-    fire_trap4.on()
+    player = Player(100, 100, 50, 50, skin)
+    fire_traps = []
     fire_hits = 0
+    finish_line = None
     
-    hole_start_index = 13  # Index where the hole begins
-    hole_width = 2  # Width of the hole in blocks
-
-    floor = [
-    Block(i * block_size, HEIGHT - block_size, block_size)
-    for i in range(-WIDTH // block_size, (WIDTH * 3) // block_size)
-    if i < hole_start_index or i >= hole_start_index + hole_width  # Skip blocks for the hole
-]
-
-    platforms = [
-        Block(block_size * 5, HEIGHT - block_size * 3, block_size),
-        Block(block_size * 7, HEIGHT - block_size * 4, block_size),
-        Block(block_size * 10, HEIGHT - block_size * 5, block_size),
-        Block(block_size * 0, HEIGHT - block_size * 2, block_size),
-        Block(block_size * 0, HEIGHT - block_size * 3, block_size),
-        Block(block_size * 0, HEIGHT - block_size * 4, block_size),
-        Block(block_size * 0, HEIGHT - block_size * 3, block_size),
-        Block(block_size * 0, HEIGHT - block_size * 4, block_size),
-        Block(block_size * 0, HEIGHT - block_size * 5, block_size),
-        Block(block_size * 0, HEIGHT - block_size * 6, block_size),
-        Block(block_size * 0, HEIGHT - block_size * 7, block_size),
-        Block(block_size * 0, HEIGHT - block_size * 8, block_size),
-        Block(block_size * 0, HEIGHT - block_size * 9, block_size),
-        Block(block_size * 0, HEIGHT - block_size * 10, block_size),
-        Block(block_size * 21, HEIGHT - block_size * 2, block_size),
-        Block(block_size * 22, HEIGHT - block_size * 2, block_size),
-        Block(block_size * 22, HEIGHT - block_size * 2, block_size),
-        Block(block_size * 23, HEIGHT - block_size * 3, block_size),
-        Block(block_size * 23, HEIGHT - block_size * 3, block_size),
-        Block(block_size * 24, HEIGHT - block_size * 4, block_size),
-        Block(block_size * 24, HEIGHT - block_size * 5, block_size),
-        Block(block_size * 23, HEIGHT - block_size * 2, block_size),
-        Block(block_size * 24, HEIGHT - block_size * 2, block_size),
-        Block(block_size * 24, HEIGHT - block_size * 3, block_size),
-        Block(block_size * 25, HEIGHT - block_size * 2, block_size),
-        Block(block_size * 25, HEIGHT - block_size * 3, block_size),
-        Block(block_size * 25, HEIGHT - block_size * 4, block_size),
-        Block(block_size * 25, HEIGHT - block_size * 5, block_size),
-        Block(block_size * 26, HEIGHT - block_size * 2, block_size),
-        Block(block_size * 26, HEIGHT - block_size * 3, block_size),
-        Block(block_size * 27, HEIGHT - block_size * 2, block_size),
-        Block(block_size * 31, HEIGHT - block_size * 2, block_size),
-        Block(block_size * 31, HEIGHT - block_size * 3, block_size),
-        Block(block_size * 31, HEIGHT - block_size * 4, block_size),
-        Block(block_size * 31, HEIGHT - block_size * 5, block_size),
-        Block(block_size * 31, HEIGHT - block_size * 6, block_size),
-        Block(block_size * 31, HEIGHT - block_size * 7, block_size),
-    ]
-    finish_line = Flag(WIDTH - -1900, HEIGHT - block_size - 100, 50, 100)
-    
-    # Number of enemies to spawn
-    num_enemies = 20  # You can change this to any number
-
-    # List to store enemies
+    # Enemies come from a pool and are only active near the camera
+    enemy_pool = EntityPool(lambda: MovingEnemy(0, 0, 32, 32, ENEMY_VEL), MAX_ENEMIES)
+    spawner = Spawner(source, enemy_pool)
+    segments = SegmentIndex(block_size)  # Where enemies can walk
     enemies = []
 
-    # Create multiple enemies
-    for _ in range(num_enemies):
-        x_position = random.randint(500, 800)  # Random x position
-        y_position = HEIGHT - block_size - 32  # Position just above the ground
-        speed = ENEMY_VEL  # Use the defined enemy velocity
-        enemy = MovingEnemy(x_position, y_position, 32, 32, speed)
-        enemies.append(enemy)
-
-    objects = [*floor, *platforms, fire_trap1, fire_trap2, fire_trap3, fire_trap4, finish_line, *enemies]  # Add enemies to the objects list
+    objects = []
+    moving_objects = []
+    particle_system = particles.ParticleSystem(scale=MASK_SCALE) if load_particles() else None
 
+    # Blocks changed, so an active enemy's floor can go on further or end sooner
+    # than when it spawned, e.g. when the next chunk was not streamed in yet
+    def update_patrols():
+        for enemy in enemies:
+            enemy.patrol(segments.find(enemy.rect))
+
+    # Add the objects of newly streamed chunks to the game
+    def add_objects(new_objects):
+        nonlocal finish_line
+        blocks_changed = False
+        for obj in new_objects:
+            if obj.name == "fire":
+                fire_traps.append(obj)
+                moving_objects.append(obj)
+            else:
+                if obj.name == "finish":
+                    finish_line = obj
+                elif isinstance(obj, Block):
+                    segments.add(obj.rect.x, obj.rect.y)
+                    blocks_changed = True
+                renderer.add_static(obj)
+        objects.extend(new_objects)
+        if blocks_changed:
+            update_patrols()
+
+    # Remove the objects of chunks that were discarded behind the camera
+    def remove_objects(old_objects):
+        nonlocal finish_line
+        if not old_objects:
+            return
+        old = set(old_objects)
+        objects[:] = [obj for obj in objects if obj not in old]
+        fire_traps[:] = [obj for obj in fire_traps if obj not in old]
+        moving_objects[:] = [obj for obj in moving_objects if obj not in old]
+        blocks_changed = False
+        for obj in old_objects:
+            if obj is finish_line:
+                finish_line = None
+            elif isinstance(obj, Block):
+                segments.remove(obj.rect.x, obj.rect.y)
+                blocks_changed = True
+            if obj.name != "fire":
+                renderer.remove_static(obj)
+        if blocks_changed:
+            update_patrols()
+
+    # Add and remove the enemies the spawner activated or gave back
+    def update_enemies(offset_x):
+        spawned, despawned = spawner.update(offset_x, WIDTH)
+        for enemy in despawned:
+            enemies.remove(enemy)
+            objects.remove(enemy)
+            moving_objects.remove(enemy)
+        for enemy in spawned:
+            enemy.patrol(segments.find(enemy.rect))
+        enemies.extend(spawned)
+        objects.extend(spawned)
+        moving_objects.extend(spawned)
+
+    add_objects(streamer.wait_for_view(0, WIDTH))
 
     offset_x = 0 
     scroll_area_width = 200
 
+    telemetry = get_telemetry()
+    sounds = get_sounds()
+    stats = get_stats()
+    frame_capture = get_frame_capture() if CAPTURE_MODE else None
+    run_stats = RunStats(level_name)
+    frame = 0
+    rewind = RewindBuffer(REWIND_SECONDS, FPS, MAX_ENEMIES, MAX_REWIND_TRAPS)
+    governor = QualityGovernor(FPS) if ADAPTIVE_QUALITY else None
+    # The delays are on the classes, so a restart has to undo what the last game's governor lowered
+    Player.ANIMATION_DELAY = Fire.ANIMATION_DELAY = ANIMATION_DELAY
+
     run = True
     while run:
-        clock.tick(FPS)
-
-        # Check collision with fire trap
-        if player.rect.colliderect(fire_trap1.rect):
-            fire_hits += 1
-            fire_trap1.on()
-            if fire_hits >= 2:
-                print("you hit the fire!")
-                game_end(window)
-                run = False
-
-        # Check collision with fire trap
-        if player.rect.colliderect(fire_trap2.rect):
-            fire_hits += 1
-            fire_trap2.on()
-            if fire_hits >= 2:
-                print("you hit the fire!")
-                game_end(window)
-                run = False
-
-        # Check collision with fire trap
-        if player.rect.colliderect(fire_trap2.rect):
-            fire_hits += 1
-            fire_trap3.on()
-            if fire_hits >= 2:
-                print("you hit the fire!")
-                game_end(window)
-                run = False
-
-        # Check collision with fire trap
-        if player.rect.colliderect(fire_trap2.rect):
-            fire_hits += 1
-            fire_trap4.on()
-            if fire_hits >= 2:
-                print("you hit the fire!")
-                game_end(window)
-                run = False
+        frame_ms = clock.tick(FPS)
+        frame += 1
+        died = False
+
+        # get_rawtime() is the time the last frame took without waiting for FPS
+        if governor and governor.update(clock.get_rawtime()):
+            Player.ANIMATION_DELAY = Fire.ANIMATION_DELAY = ANIMATION_DELAY * governor.animation_scale
+            if particle_system:
+                particle_system.count_scale = governor.particle_scale
+
+        # Hold backspace to rewind at double speed
+        if pygame.key.get_pressed()[pygame.K_BACKSPACE] and rewind.frames > 1:
+            pygame.event.pump()
+            offset_x, fire_hits, frame = rewind.restore(2, player, enemy_pool, fire_traps)
+            player.update_sprite()
+            draw(window, renderer, player, moving_objects, particle_system, offset_x)
+            continue
+
+        # Check collision with fire traps, 1 pixel up and down also counts for standing on one
+        reach = player.hitbox.inflate(FIRE_REACH * 2, 2)
+        for fire_trap in fire_traps:
+            if reach.colliderect(fire_trap.hitbox):
+                fire_hits += 1
+                run_stats.fire_hits += 1
+                fire_trap.on()
+                sounds.play("fire")
+                if particle_system:
+                    particle_system.emit(particles.FIRE, fire_trap.rect.centerx, fire_trap.rect.top, 4)
+                if fire_hits >= 2 and not died:
+                    print("you hit the fire!")
+                    if telemetry:
+                        telemetry.death(frame, CAUSE_FIRE, player.rect.x, player.rect.y)
+                    run_stats.death("fire", player.rect.x, player.rect.y)
+                    died = True
 
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
@@ -533,16 +891,61 @@ def main(window):
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_SPACE and player.jump_count < 2:
                     player.jump()
+                    sounds.play("jump")
+                    run_stats.jumps += 1
+                if event.key == pygame.K_F12:
+                    frame_capture = frame_capture or get_frame_capture()
+                    if frame_capture:
+                        frame_capture.screenshot(window)
+
+        # Apply a saved level change without restarting, only the changed tiles are touched
+        if watcher and watcher.changed():
+            level = watcher.load()
+            if level:
+                new_tiles = load_level(level, block_size)
+                added_tiles, removed_tiles = diff_tiles(level_tiles, new_tiles)
+                level_tiles = new_tiles
+                source = LevelSource(new_tiles, chunk_width, load_spawn_points(level, block_size))
+                spawner.source = source
+                added, removed = streamer.reload(source, added_tiles, removed_tiles, tile_of)
+                remove_objects(removed)
+                add_objects(added)
+                print("Reloaded level: %d tiles added, %d removed" % (len(added_tiles), len(removed_tiles)))
+
+        add_objects(streamer.update(offset_x, WIDTH))
+        remove_objects(streamer.discard(offset_x, WIDTH))
+        update_enemies(offset_x)
 
         player.loop(FPS)
-        fire_trap1.loop()
-        fire_trap2.loop()
-        fire_trap3.loop()
-        fire_trap4.loop()
+        for fire_trap in fire_traps:
+            if governor and not governor.animate_offscreen and not (
+                    offset_x - fire_trap.rect.width < fire_trap.rect.x < offset_x + WIDTH):
+                continue
+            fire_trap.loop()
         for enemy in enemies:
             enemy.move()
+        was_hit = player.hit
+        fall_speed = player.y_vel
         handle_move(player, objects)
-        draw(window, background, bg_image, player, objects, offset_x)
+
+        if player.hit and not was_hit:
+            sounds.play("hit")
+
+        if particle_system:
+            if player.hit and not was_hit:
+                particle_system.emit(particles.HIT, player.rect.centerx, player.rect.centery, 40, 5)
+            if fall_speed > player.GRAVITY * 4 and player.y_vel == 0:
+                particle_system.emit(particles.DUST, player.rect.centerx, player.rect.bottom, 12, 2)
+            particle_system.update()
+
+        if not governor or governor.should_draw(frame):
+            draw(window, renderer, player, moving_objects, particle_system, offset_x,
+                 not governor or governor.draw_background)
+            if frame_capture:
+                frame_capture.capture(window)
+
+        if telemetry:
+            telemetry.tick(frame, player.rect.x, player.rect.y, player.x_vel, player.y_vel, frame_ms)
 
         # Camera scrolling
         if ((player.rect.right - offset_x >= WIDTH - scroll_area_width) and player.x_vel > 0) or (
@@ -550,27 +953,65 @@ def main(window):
             offset_x += player.x_vel
 
         # Check if player has reached the finish line
-        if player.rect.colliderect(finish_line.rect):
+        if finish_line and player.rect.colliderect(finish_line.rect):
             print("You reached the finish line!")
+            sounds.play("finish")
+            stats.record(run_stats, "finish")
+            stats.flush()
+            run_stats = None
+            if telemetry:
+                telemetry.finish(frame, player.rect.x, player.rect.y)
             if you_win(window):  # Trigger You Win screen and restart if the user presses a key
                 main(window)
                 run = False
 
         # Check if player hits any enemy
         for enemy in enemies:
-            if pygame.sprite.collide_mask(player, enemy):
+            if collide_mask(player, enemy):
                 print("You were hit by an enemy!")
-                run = False
+                sounds.play("enemy")
+                if telemetry:
+                    telemetry.death(frame, CAUSE_ENEMY, player.rect.x, player.rect.y)
+                run_stats.death("enemy", player.rect.x, player.rect.y)
+                died = True
                 break
 
+        # Check if player fell out of the level
+        if not died and player.rect.y > FALL_LIMIT:
+            print("You fell!")
+            if telemetry:
+                telemetry.death(frame, CAUSE_FALL, player.rect.x, player.rect.y)
+            run_stats.death("fall", player.rect.x, player.rect.y)
+            died = True
+
+        # Dying rewinds a few seconds instead of restarting the whole game
+        if died:
+            if REWIND_ON_DEATH and rewind.frames > 1:
+                offset_x, fire_hits, frame = rewind.restore(REWIND_ON_DEATH * FPS, player, enemy_pool, fire_traps)
+                if particle_system:
+                    particle_system.clear()
+                continue
+            run = False
+        rewind.record(offset_x, fire_hits, frame, player, enemy_pool, fire_traps)
+
         if not run:
+            if run_stats:
+                stats.record(run_stats, "dead" if died else "quit")
+                stats.flush()
+                run_stats = None
+            streamer.shutdown()
             if game_end(window):
                 main(window)
 
+    if telemetry:
+        telemetry.close()
+    stats.close()
+    if frame_capture:
+        frame_capture.close()
     pygame.quit()
     quit()
 
 
 if __name__ == "__main__":
-    main(window)
+    Game().run()
 
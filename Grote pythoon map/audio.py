@@ -0,0 +1,85 @@
+from array import array
+from os.path import isfile, join
+
+import pygame
+
+# Sound effects: priority, minimum time between two plays in ms, fallback tone (Hz, ms)
+# A sound with a higher priority may take over a channel from a lower one.
+SOUNDS = {
+    "jump": (1, 60, (660, 80)),
+    "fire": (2, 250, (180, 120)),
+    "hit": (3, 300, (120, 200)),
+    "enemy": (3, 300, (90, 250)),
+    "finish": (5, 0, (880, 400)),
+}
+
+
+# Function to make a short square wave, used when a sound file is missing
+def make_tone(frequency, duration, volume=0.25):
+    rate, size, channels = pygame.mixer.get_init()
+    amplitude = int(volume * (2 ** (abs(size) - 1) - 1))
+    period = max(1, rate // frequency)
+    samples = array("h" if abs(size) == 16 else "b")
+    for i in range(rate * duration // 1000):
+        value = amplitude if (i % period) < period // 2 else -amplitude
+        samples.extend([value] * channels)
+    return pygame.mixer.Sound(buffer=samples.tobytes())
+
+
+# Decodes every sound effect once and plays them on a fixed set of channels.
+# When all channels are busy the lowest priority sound is cut off, unless the
+# new sound is less important. Sounds played again too quickly are skipped.
+# Nothing is loaded or created while playing.
+class SoundBank:
+    def __init__(self, folder=join("assets", "Sounds"), channels=8):
+        self.enabled = pygame.mixer.get_init() is not None
+        self.sounds = {}
+        self.priorities = {}
+        self.intervals = {}
+        self.last_played = {}
+        if not self.enabled:
+            return
+
+        pygame.mixer.set_num_channels(channels)
+        self.channels = [pygame.mixer.Channel(i) for i in range(channels)]
+        self.channel_priority = [0] * channels
+        self.channel_started = [0] * channels
+
+        for name, (priority, interval, (frequency, duration)) in SOUNDS.items():
+            self.sounds[name] = self.load(folder, name) or make_tone(frequency, duration)
+            self.priorities[name] = priority
+            self.intervals[name] = interval
+            self.last_played[name] = -interval
+
+    def load(self, folder, name):
+        for extension in (".wav", ".ogg"):
+            path = join(folder, name + extension)
+            if isfile(path):
+                return pygame.mixer.Sound(path)
+        return None
+
+    def play(self, name):
+        if not self.enabled:
+            return
+        now = pygame.time.get_ticks()
+        if now - self.last_played[name] < self.intervals[name]:
+            return
+        priority = self.priorities[name]
+
+        # Take a free channel, or else the least important and oldest sound
+        best = 0
+        for index, channel in enumerate(self.channels):
+            if not channel.get_busy():
+                best = index
+                break
+            if self.channel_priority[index] < self.channel_priority[best] or (
+                    self.channel_priority[index] == self.channel_priority[best]
+                    and self.channel_started[index] < self.channel_started[best]):
+                best = index
+        if self.channels[best].get_busy() and self.channel_priority[best] > priority:
+            return
+
+        self.channels[best].play(self.sounds[name])
+        self.channel_priority[best] = priority
+        self.channel_started[best] = now
+        self.last_played[name] = now
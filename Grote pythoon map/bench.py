@@ -0,0 +1,249 @@
+# Benchmarks for the functions the game calls every frame. Runs without a window
+# on the SDL dummy driver, so results only depend on the code and the machine.
+#
+#   python bench.py                 run everything and compare with the baseline
+#   python bench.py --save          run everything and store the results as the new baseline
+#   python bench.py --filter draw   only run benchmarks whose name contains "draw"
+#
+# Exits with status 1 when a benchmark got slower than the baseline by more than --threshold.
+import argparse
+import gc
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.chdir(os.path.dirname(os.path.abspath(__file__)))  # Assets are loaded from relative paths
+
+import pygame
+import Platerformer as game
+from render import Renderer
+
+BASELINE = "bench_baseline.json"
+BLOCK_SIZE = 96
+OBJECT_COUNTS = (100, 1000)  # Extra objects on top of the floor
+LEVEL_LENGTHS = (50, 500)  # Floor length in blocks
+
+
+# Everything a benchmark needs: a level with a floor, platforms, fire traps and enemies
+class Scene:
+    def __init__(self, object_count, level_length, seed=1):
+        rng = random.Random(seed)
+        floor_y = game.HEIGHT - BLOCK_SIZE
+        tiles = [("block", column * BLOCK_SIZE, floor_y) for column in range(level_length)]
+        enemy_points = []
+        for _ in range(object_count):
+            x = rng.randrange(level_length) * BLOCK_SIZE
+            kind = rng.random()
+            if kind < 0.8:
+                tiles.append(("block", x, game.HEIGHT - BLOCK_SIZE * rng.randint(3, 6)))
+            elif kind < 0.9:
+                tiles.append(("fire", x, floor_y - 64))
+            else:
+                enemy_points.append((x, floor_y - 32))
+
+        self.objects = game.build_objects(tiles, BLOCK_SIZE)
+        self.fire_traps = [obj for obj in self.objects if obj.name == "fire"]
+        self.enemies = []
+        for x, y in enemy_points:
+            enemy = game.MovingEnemy(x, y, 32, 32, game.ENEMY_VEL)
+            enemy.patrol((x - BLOCK_SIZE * 2, x + BLOCK_SIZE * 2))
+            self.enemies.append(enemy)
+
+        background, bg_image = game.get_background("Blue.png")
+        self.renderer = Renderer(game.WIDTH, game.HEIGHT, game.MASK_SCALE)
+        self.renderer.set_background(bg_image, background)
+        for obj in self.objects:
+            if obj.name != "fire":
+                self.renderer.add_static(obj)
+        self.moving_objects = self.fire_traps
+
+        # The camera looks at the middle of the level, the player stands on the floor there
+        self.offset_x = level_length * BLOCK_SIZE // 2
+        self.player = game.Player(self.offset_x + 300, 0, 50, 50)
+        self.reset_player()
+
+    def reset_player(self):
+        player = self.player
+        player.update_sprite()
+        player.rect.bottom = game.HEIGHT - BLOCK_SIZE
+        player.x_vel = player.y_vel = 0
+        player.fall_count = player.jump_count = 0
+
+
+# Function to time a benchmark, returns the time of one call in microseconds for every round.
+# With `setup` every round is one call right after setup() ran, for timing cold caches.
+def measure(function, repeat, min_time=0.02, setup=None):
+    # Find how many calls fill min_time seconds, so the timer resolution does not matter
+    number = 1
+    while setup is None:
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        if time.perf_counter() - start >= min_time:
+            break
+        number *= 2
+
+    results = []
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            if setup:
+                setup()
+            start = time.perf_counter()
+            for _ in range(number):
+                function()
+            results.append((time.perf_counter() - start) / number * 1e6)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return results
+
+
+# Function to empty every cache loading goes through, so the PNGs are read and decoded again
+def clear_caches():
+    game.sprite_sheet_cache.clear()
+    game.block_cache.clear()
+    game.assets.clear()
+
+
+# Function to make the benchmarks that do not depend on the level, they are timed cold
+def loading_benchmarks():
+    def load_sprite_sheets():
+        game.load_sprite_sheets("MainCharacters", "NinjaFrog", 32, 32, True)
+
+    def get_block():
+        game.get_block(BLOCK_SIZE)
+
+    return [("load_sprite_sheets", load_sprite_sheets), ("get_block", get_block)]
+
+
+# Function to make the benchmarks that run on a scene
+def scene_benchmarks(scene):
+    player = scene.player
+    objects = scene.objects
+
+    def player_loop():
+        scene.reset_player()
+        player.loop(game.FPS)
+
+    def collide():
+        game.collide(player, objects, game.PLAYER_VEL * 2)
+
+    def handle_vertical_collision():
+        player.rect.bottom = game.HEIGHT - BLOCK_SIZE + 4
+        game.handle_vertical_collision(player, objects, 1)
+
+    def handle_move():
+        scene.reset_player()
+        player.rect.y += 4
+        game.handle_move(player, objects)
+
+    def fire_loop():
+        for fire_trap in scene.fire_traps:
+            fire_trap.loop()
+
+    def enemy_move():
+        for enemy in scene.enemies:
+            enemy.move()
+
+    def draw():
+        game.draw(game.window, scene.renderer, player, scene.moving_objects, None, scene.offset_x)
+
+    return [
+        ("Player.loop", player_loop),
+        ("Player.update_sprite", player.update_sprite),
+        ("Player.update", player.update),
+        ("collide", collide),
+        ("handle_vertical_collision", handle_vertical_collision),
+        ("handle_move", handle_move),
+        ("Fire.loop", fire_loop),
+        ("MovingEnemy.move", enemy_move),
+        ("draw", draw),
+    ]
+
+
+def run(pattern, repeat):
+    results = {}
+
+    def record(name, function, setup=None):
+        if pattern and pattern not in name:
+            return
+        times = measure(function, repeat, setup=setup)
+        results[name] = {
+            "median": statistics.median(times),
+            "mean": statistics.fmean(times),
+            "stdev": statistics.stdev(times) if len(times) > 1 else 0.0,
+            "min": min(times),
+        }
+        print("%-52s %10.2f us  +- %5.1f%%  min %10.2f" % (
+            name, results[name]["median"], results[name]["stdev"] / results[name]["mean"] * 100,
+            results[name]["min"]), flush=True)
+
+    for name, function in loading_benchmarks():
+        record(name, function, clear_caches)
+    for object_count in OBJECT_COUNTS:
+        for level_length in LEVEL_LENGTHS:
+            scene = Scene(object_count, level_length)
+            for name, function in scene_benchmarks(scene):
+                record("%s[objects=%d,length=%d]" % (name, object_count, level_length), function)
+    return results
+
+
+# Function to compare results with a baseline, returns the names that got slower than the threshold
+def compare(results, baseline, threshold):
+    regressions = []
+    print()
+    print("%-52s %10s %10s %8s" % ("compared with baseline", "baseline", "now", "change"))
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]["median"]
+        change = (result["median"] - before) / before
+        flag = ""
+        if change > threshold:
+            flag = "  SLOWER"
+            regressions.append(name)
+        elif change < -threshold:
+            flag = "  faster"
+        print("%-52s %10.2f %10.2f %+7.1f%%%s" % (name, before, result["median"], change * 100, flag))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the hot functions of the platformer")
+    parser.add_argument("--save", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--baseline", default=BASELINE, help="baseline file (default %(default)s)")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="slowdown that counts as a regression, 0.15 is 15%% (default %(default)s)")
+    parser.add_argument("--repeat", type=int, default=7, help="rounds per benchmark (default %(default)s)")
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this")
+    args = parser.parse_args()
+
+    game.init_display(headless=True)
+    results = run(args.filter, args.repeat)
+
+    if args.save:
+        baseline = {}
+        if os.path.isfile(args.baseline):
+            with open(args.baseline) as file:
+                baseline = json.load(file)
+        baseline.update(results)
+        with open(args.baseline, "w") as file:
+            json.dump(baseline, file, indent=2, sort_keys=True)
+        print("Saved baseline to", args.baseline)
+    elif os.path.isfile(args.baseline):
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.threshold)
+        if regressions:
+            print("%d benchmarks got slower than %.0f%%" % (len(regressions), args.threshold * 100))
+            sys.exit(1)
+    else:
+        print("No baseline yet, run with --save to store one")
+
+    pygame.quit()
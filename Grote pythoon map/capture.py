@@ -0,0 +1,116 @@
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+
+import numpy as np
+import pygame
+
+
+# Function to write pixels (width x height x 3) as a PNG. zlib lets other threads
+# run while it compresses, pygame.image.save would hold up the game instead.
+def write_png(path, pixels, rows=None, level=1):
+    width, height, _ = pixels.shape
+    if rows is None:
+        rows = np.zeros((height, 1 + width * 3), np.uint8)
+    rows[:, 1:] = pixels.transpose(1, 0, 2).reshape(height, -1)  # Every row starts with filter type 0
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    with open(path, "wb") as file:
+        file.write(b"\x89PNG\r\n\x1a\n")
+        file.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)))
+        file.write(chunk(b"IDAT", zlib.compress(rows, level)))
+        file.write(chunk(b"IEND", b""))
+
+
+# Records the window while playing without slowing the game down. capture()
+# reads the pixels through a surfarray view of the surface, so pygame makes no
+# copy, and moves them into one of a few buffers made up front. A worker thread
+# writes the buffers to disk and hands them back. When all buffers are still
+# waiting for the worker the frame is dropped instead of making the game wait.
+#
+# mode "png" writes an image sequence, "raw" writes one file of rgb24 frames
+# (ffmpeg -f rawvideo -pix_fmt rgb24 -s WxH -r FPS -i capture.rgb video.mp4) and
+# None writes nothing, for tools that only want the frames through `callback`.
+# callback(number, pixels) runs on the worker, pixels is a width x height x 3
+# array that is only valid during the call.
+class FrameCapture:
+    def __init__(self, size, folder="captures", mode="png", buffers=8, every=1, callback=None):
+        self.size = size
+        self.folder = folder
+        self.mode = mode
+        self.every = every
+        self.callback = callback
+        self.buffers = [np.zeros((size[0], size[1], 3), np.uint8) for _ in range(buffers)]
+        self.rows = np.zeros((size[1], 1 + size[0] * 3), np.uint8)  # Scratch buffer of the PNG writer
+        self.free = queue.Queue()
+        for index in range(buffers):
+            self.free.put(index)
+        self.ready = queue.Queue()
+        self.frames = 0
+        self.captured = 0
+        self.dropped = 0
+        self.raw = None
+        self.session = time.strftime("%Y%m%d-%H%M%S")
+        if mode == "raw":
+            os.makedirs(folder, exist_ok=True)
+            self.raw = open(os.path.join(folder, "capture-%s-%dx%d.rgb" % (self.session, *size)), "wb")
+        self.thread = threading.Thread(target=self._run, name="capture", daemon=True)
+        self.thread.start()
+
+    # Queues the surface as the next frame, returns False when it was skipped or dropped
+    def capture(self, surface):
+        self.frames += 1
+        if (self.mode is None and self.callback is None) or self.frames % self.every:
+            return False
+        return self._queue(surface, self.frames, self.mode)
+
+    # Queues one frame to be saved as a PNG, also when not recording
+    def screenshot(self, surface):
+        return self._queue(surface, self.frames, "screenshot")
+
+    def _queue(self, surface, number, kind):
+        try:
+            index = self.free.get_nowait()
+        except queue.Empty:
+            self.dropped += 1
+            return False
+        pixels = pygame.surfarray.pixels3d(surface)
+        np.copyto(self.buffers[index], pixels)
+        del pixels  # Unlocks the surface again
+        self.captured += 1
+        self.ready.put((index, number, kind))
+        return True
+
+    def close(self):
+        self.ready.put(None)
+        self.thread.join()
+        if self.raw:
+            self.raw.close()
+
+    def _run(self):
+        while True:
+            item = self.ready.get()
+            if item is None:
+                break
+            index, number, kind = item
+            pixels = self.buffers[index]
+            try:
+                if kind == "screenshot":
+                    self._save_png(pixels, "screenshot-%s-%06d.png" % (self.session, number))
+                elif kind == "png":
+                    self._save_png(pixels, "frame-%s-%06d.png" % (self.session, number))
+                elif kind == "raw":
+                    self.raw.write(pixels.transpose(1, 0, 2).tobytes())
+                if self.callback and kind != "screenshot":
+                    self.callback(number, pixels)
+            finally:
+                self.free.put(index)
+
+    def _save_png(self, pixels, name):
+        os.makedirs(self.folder, exist_ok=True)
+        write_png(os.path.join(self.folder, name), pixels, self.rows)
@@ -0,0 +1,44 @@
+import os
+import runpy
+import time
+import traceback
+from types import SimpleNamespace
+
+
+# Watches a level file and loads it again when it is saved. Only checks the
+# modification time every `interval` seconds, so it costs nothing per frame.
+class LevelWatcher:
+    def __init__(self, path, interval=0.5):
+        self.path = path
+        self.interval = interval
+        self.mtime = os.stat(path).st_mtime_ns
+        self.next_check = time.monotonic() + interval
+
+    def changed(self):
+        now = time.monotonic()
+        if now < self.next_check:
+            return False
+        self.next_check = now + self.interval
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return False  # Editors sometimes replace the file while saving
+        if mtime == self.mtime:
+            return False
+        self.mtime = mtime
+        return True
+
+    # Returns the level as a module-like object, or None when it has errors
+    def load(self):
+        try:
+            return SimpleNamespace(**runpy.run_path(self.path))
+        except Exception:
+            traceback.print_exc()
+            return None
+
+
+# Function to find the tiles that were added and removed between two versions of a level
+def diff_tiles(old_tiles, new_tiles):
+    old_tiles = set(old_tiles)
+    new_tiles = set(new_tiles)
+    return new_tiles - old_tiles, old_tiles - new_tiles
@@ -0,0 +1,98 @@
+import random
+import threading
+from collections import OrderedDict
+
+COLUMNS = 8  # Block columns per chunk
+SAFE_CHUNKS = 1  # Chunks from the start that are always flat floor
+
+
+# Generates an endless level one chunk at a time. Every chunk only depends on
+# the seed and its own index, so chunks can be thrown away behind the camera
+# and generated again in any order, and the same seed gives the same world.
+# Works as a chunk source for ChunkStreamer and a spawn point source for Spawner.
+class EndlessSource:
+    def __init__(self, seed, block_size, height, cache_size=16):
+        self.seed = seed
+        self.block_size = block_size
+        self.height = height
+        self.chunk_width = block_size * COLUMNS
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()  # Chunk workers and the game loop both generate
+
+    def has_chunk(self, index):
+        return index >= -1
+
+    def tiles(self, index):
+        return self.generate(index)[0]
+
+    def spawn_points(self, left, right):
+        points = []
+        for index in range(max(-1, int(left) // self.chunk_width), int(right) // self.chunk_width + 1):
+            points.extend(point for point in self.generate(index)[1] if left <= point[0] <= right)
+        return points
+
+    def generate(self, index):
+        with self.lock:
+            chunk = self.cache.get(index)
+            if chunk is None:
+                chunk = self.build_chunk(index)
+                self.cache[index] = chunk
+                if len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+            return chunk
+
+    def build_chunk(self, index):
+        rng = random.Random(self.seed * 1000003 + index)
+        size = self.block_size
+        floor_y = self.height - size
+        first_column = index * COLUMNS
+        tiles = []
+        spawn_points = []
+
+        if index <= SAFE_CHUNKS:
+            for column in range(first_column, first_column + COLUMNS):
+                tiles.append(("block", column * size, floor_y))
+            if index == -1:
+                # Wall at the start so the player can't walk off the left side
+                for row in range(2, 9):
+                    tiles.append(("block", first_column * size, self.height - size * row))
+            return tiles, spawn_points
+
+        # Pits are one or two columns wide and never touch the chunk edges,
+        # so two pits never join into one that is too wide to jump over
+        pits = set()
+        if rng.random() < 0.6:
+            start = first_column + rng.randint(1, COLUMNS - 3)
+            pits.update(range(start, start + rng.randint(1, 2)))
+
+        floor_columns = []
+        for column in range(first_column, first_column + COLUMNS):
+            if column in pits:
+                continue
+            tiles.append(("block", column * size, floor_y))
+            floor_columns.append(column)
+
+        # Small steps on the floor and floating platforms above it
+        stacks = set()
+        for _ in range(rng.randint(0, 2)):
+            column = rng.choice(floor_columns)
+            stacks.add(column)
+            for row in range(2, 2 + rng.randint(1, 2)):
+                tiles.append(("block", column * size, self.height - size * row))
+        for _ in range(rng.randint(0, 2)):
+            column = first_column + rng.randrange(COLUMNS)
+            if column not in stacks:
+                tiles.append(("block", column * size, self.height - size * rng.randint(4, 5)))
+
+        open_floor = [column for column in floor_columns if column not in stacks]
+        if open_floor and rng.random() < 0.5:
+            column = rng.choice(open_floor)
+            tiles.append(("fire", column * size + size // 2 - 16, floor_y - 64))
+            open_floor.remove(column)
+        for _ in range(rng.randint(0, 2)):
+            if open_floor:
+                column = rng.choice(open_floor)
+                spawn_points.append((column * size + size // 2 - 16, floor_y - 32))
+
+        return tiles, spawn_points
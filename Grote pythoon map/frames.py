@@ -0,0 +1,69 @@
+from collections import namedtuple
+
+import pygame
+
+# Frames whose pixels fill less than this part of their hitbox are "irregular",
+# for those collisions are checked pixel by pixel after the hitboxes overlap
+IRREGULAR_FILL = 0.7
+
+# One animation frame with everything collision needs, made once when it is loaded.
+# hitbox is in world pixels relative to the top left of the image.
+Frame = namedtuple("Frame", "image mask hitbox irregular")
+
+
+# Function to make a frame from an image stored at 1/scale of its world size
+def make_frame(image, scale=1):
+    mask = pygame.mask.from_surface(image)
+    rects = mask.get_bounding_rects()
+    if not rects:
+        return Frame(image, mask, pygame.Rect(0, 0, 0, 0), False)
+
+    box = rects[0].unionall(rects[1:])
+    irregular = mask.count() < box.width * box.height * IRREGULAR_FILL
+    hitbox = pygame.Rect(box.x * scale, box.y * scale, box.width * scale, box.height * scale)
+    return Frame(image, mask, hitbox, irregular)
+
+
+# Function to mirror a frame, the hitbox is mirrored with it
+def flip_frame(frame, scale=1):
+    image = pygame.transform.flip(frame.image, True, False)
+    hitbox = frame.hitbox.copy()
+    hitbox.x = image.get_width() * scale - frame.hitbox.right
+    return Frame(image, pygame.mask.from_surface(image), hitbox, frame.irregular)
+
+
+# Directions and animation states as numbers, so picking a frame is only indexing
+LEFT, RIGHT = 0, 1
+DIRECTIONS = ("left", "right")
+IDLE, RUN, JUMP, DOUBLE_JUMP, FALL, HIT = range(6)
+PLAYER_STATES = ("idle", "run", "jump", "double_jump", "fall", "hit")  # Sheet name of every player state
+OFF, ON = range(2)
+FIRE_STATES = ("off", "on")
+WALK = 0  # Enemies only walk
+
+
+# Function to make an animation table: table[state][direction] is a tuple of frames.
+# frames_of(name, direction) gives the frames of one sheet, e.g. ("run", "left").
+def compile_animations(frames_of, states):
+    return tuple(tuple(tuple(frames_of(name, direction)) for direction in DIRECTIONS) for name in states)
+
+
+# Shared by everything that animates. Needs `animations` (a table from
+# compile_animations) or its own frames(), `state`, `facing`, `animation_count`
+# and ANIMATION_DELAY. Changing the state or the direction starts the new
+# animation from its first frame.
+class Animated:
+    def set_animation(self, state, facing):
+        if state != self.state or facing != self.facing:
+            self.state = state
+            self.facing = facing
+            self.animation_count = 0
+
+    def frames(self, state, facing):
+        return self.animations[state][facing]
+
+    def next_frame(self):
+        frames = self.frames(self.state, self.facing)
+        frame = frames[(self.animation_count // self.ANIMATION_DELAY) % len(frames)]
+        self.animation_count += 1
+        return frame
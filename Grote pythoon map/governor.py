@@ -0,0 +1,64 @@
+# Quality steps, every level keeps the savings of the levels before it
+FULL = 0
+SLOW_ANIMATION = 1  # Animations advance half as often
+STILL_OFFSCREEN_TRAPS = 2  # Traps outside the view are not animated
+NO_BACKGROUND = 3  # The background layer is replaced by a plain color
+FEW_PARTICLES = 4  # Only a quarter of the particles are emitted
+SKIP_FRAMES = 5  # Only every other frame is drawn, the game still updates every frame
+
+
+# Lowers the quality step by step when frames take longer than the frame budget
+# and raises it again when there is time left. Uses a moving average of the time
+# spent on each frame, and a level only changes after it has been over or under
+# budget for a while, so one slow frame does not make the quality jump around.
+class QualityGovernor:
+    def __init__(self, fps, smoothing=0.05, degrade_after=30, recover_after=180, headroom=0.6):
+        self.budget = 1000 / fps
+        self.smoothing = smoothing
+        self.degrade_after = degrade_after
+        self.recover_after = recover_after
+        self.headroom = headroom
+        self.average = self.budget / 2
+        self.level = FULL
+        self.over = 0
+        self.under = 0
+
+    # Feeds the time the last frame took in ms, returns True when the level changed
+    def update(self, frame_ms):
+        self.average += (frame_ms - self.average) * self.smoothing
+        if self.average > self.budget:
+            self.over += 1
+            self.under = 0
+            if self.over >= self.degrade_after and self.level < SKIP_FRAMES:
+                self.level += 1
+                self.over = 0
+                return True
+        elif self.average < self.budget * self.headroom:
+            self.under += 1
+            self.over = 0
+            if self.under >= self.recover_after and self.level > FULL:
+                self.level -= 1
+                self.under = 0
+                return True
+        else:
+            self.over = self.under = 0
+        return False
+
+    @property
+    def animation_scale(self):
+        return 2 if self.level >= SLOW_ANIMATION else 1
+
+    @property
+    def animate_offscreen(self):
+        return self.level < STILL_OFFSCREEN_TRAPS
+
+    @property
+    def draw_background(self):
+        return self.level < NO_BACKGROUND
+
+    @property
+    def particle_scale(self):
+        return 0.25 if self.level >= FEW_PARTICLES else 1.0
+
+    def should_draw(self, frame):
+        return self.level < SKIP_FRAMES or frame % 2 == 0
@@ -0,0 +1,28 @@
+# Layout of the first level
+# Blocks are (column, row) on the block grid, row 1 is the floor and rows count upwards.
+# Fire traps and the finish flag are placed by their x position and stand on the floor.
+
+FLOOR = range(-11, 31)
+HOLES = range(13, 15)  # Columns left open in the floor
+
+PLATFORMS = [
+    (5, 3),
+    (7, 4),
+    (10, 5),
+    (0, 2), (0, 3), (0, 4), (0, 5), (0, 6), (0, 7), (0, 8), (0, 9), (0, 10),
+    (21, 2),
+    (22, 2),
+    (23, 2), (23, 3),
+    (24, 2), (24, 3), (24, 4), (24, 5),
+    (25, 2), (25, 3), (25, 4), (25, 5),
+    (26, 2), (26, 3),
+    (27, 2),
+    (31, 2), (31, 3), (31, 4), (31, 5), (31, 6), (31, 7),
+]
+
+FIRES = [300, 650, 1500, 1950]
+FLAG = 2900
+
+# Enemies walk on the floor and spawn when the camera gets close
+ENEMIES = [510, 525, 540, 560, 575, 590, 610, 630, 645, 660,
+           675, 690, 705, 720, 735, 750, 765, 775, 785, 800]
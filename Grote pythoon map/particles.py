@@ -0,0 +1,87 @@
+import numpy as np
+import pygame
+
+from render import submit
+
+# Particle kinds: color, size in pixels, gravity per frame, lifetime in frames
+HIT = 0
+FIRE = 1
+DUST = 2
+KINDS = [
+    ((230, 40, 40), 6, 0.3, 30),
+    ((255, 170, 30), 4, -0.15, 20),
+    ((180, 140, 90), 5, 0.1, 18),
+]
+
+
+# Particles stored in preallocated NumPy arrays and updated all at once.
+# Dead slots go back on a free list, so emitting and updating never allocates
+# new arrays and the memory use is fixed by the capacity.
+class ParticleSystem:
+    def __init__(self, capacity=4096, scale=1, seed=None):
+        self.capacity = capacity
+        self.scale = scale
+        self.position = np.zeros((capacity, 2), np.float32)
+        self.velocity = np.zeros((capacity, 2), np.float32)
+        self.gravity = np.zeros(capacity, np.float32)
+        self.life = np.zeros(capacity, np.float32)
+        self.kind = np.zeros(capacity, np.int8)
+        self.alive = np.zeros(capacity, bool)
+        self.dying = np.zeros(capacity, bool)
+        self.free = np.arange(capacity - 1, -1, -1, dtype=np.int32)
+        self.free_count = capacity
+        self.rng = np.random.default_rng(seed)
+        self.count_scale = 1.0  # Lowered by the quality governor when frames are slow
+
+        self.surfaces = []
+        for color, size, _, _ in KINDS:
+            surface = pygame.Surface((max(1, size // scale), max(1, size // scale)))
+            surface.fill(color)
+            self.surfaces.append(surface)
+
+    def emit(self, kind, x, y, count, speed=3.0):
+        count = min(max(1, int(count * self.count_scale)), self.free_count)
+        if count <= 0:
+            return
+        slots = self.free[self.free_count - count:self.free_count]
+        self.free_count -= count
+
+        _, _, gravity, life = KINDS[kind]
+        angle = self.rng.uniform(0, 2 * np.pi, count)
+        power = self.rng.uniform(0.3, 1.0, count) * speed
+        self.position[slots, 0] = x
+        self.position[slots, 1] = y
+        self.velocity[slots, 0] = np.cos(angle) * power
+        self.velocity[slots, 1] = np.sin(angle) * power
+        self.gravity[slots] = gravity
+        self.life[slots] = life
+        self.kind[slots] = kind
+        self.alive[slots] = True
+
+    def update(self):
+        self.velocity[:, 1] += self.gravity
+        self.position += self.velocity
+        self.life -= 1
+
+        np.less_equal(self.life, 0, out=self.dying)
+        np.logical_and(self.dying, self.alive, out=self.dying)
+        if self.dying.any():
+            slots = np.flatnonzero(self.dying)
+            self.alive[slots] = False
+            self.free[self.free_count:self.free_count + len(slots)] = slots
+            self.free_count += len(slots)
+
+    def draw(self, target, offset_x):
+        if self.free_count == self.capacity:
+            return
+        slots = np.flatnonzero(self.alive)
+        xs = ((self.position[slots, 0] - offset_x) // self.scale).astype(np.int32).tolist()
+        ys = (self.position[slots, 1] // self.scale).astype(np.int32).tolist()
+        surfaces = self.surfaces
+        submit(target, [(surfaces[kind], (x, y)) for kind, x, y in zip(self.kind[slots].tolist(), xs, ys)])
+
+    def clear(self):
+        self.alive[:] = False
+        self.life[:] = 0
+        self.free[:] = np.arange(self.capacity - 1, -1, -1, dtype=np.int32)
+        self.free_count = self.capacity
@@ -0,0 +1,87 @@
+import pygame
+
+# pygame-ce has Surface.fblits, plain pygame only has Surface.blits
+HAS_FBLITS = hasattr(pygame.Surface, "fblits")
+
+
+# Collects (surface, position) pairs and submits them in one call
+class RenderQueue:
+    def __init__(self):
+        self.items = []
+
+    def add(self, surface, position):
+        self.items.append((surface, position))
+
+    def flush(self, target):
+        if self.items:
+            submit(target, self.items)
+            self.items.clear()
+
+
+def submit(target, items):
+    if HAS_FBLITS:
+        target.fblits(items)
+    else:
+        target.blits(items, False)
+
+
+# Draws the game in three layers: the background, static level content and
+# moving objects. Static content is kept in buckets of world positions so
+# only the buckets in view are looked at every frame.
+# With a scale above 1 the world is drawn into a small frame at 1x that is
+# scaled up to the window once per frame by present().
+class Renderer:
+    def __init__(self, view_width, view_height, scale=1, bucket_width=512):
+        self.view_width = view_width
+        self.scale = scale
+        self.bucket_width = bucket_width
+        self.background = ()
+        self.buckets = {}
+        self.queue = RenderQueue()
+        self.frame = None
+        if scale > 1:
+            self.frame = pygame.Surface((view_width // scale, view_height // scale)).convert()
+
+    def target(self, window):
+        return self.frame or window
+
+    def present(self, window):
+        if self.frame:
+            pygame.transform.scale(self.frame, window.get_size(), window)
+
+    def set_background(self, image, tiles):
+        self.background = tuple((image, tile) for tile in tiles)
+
+    def add_static(self, obj):
+        x, y = obj.rect.topleft
+        self.buckets.setdefault(x // self.bucket_width, []).append(
+            (obj.image, x // self.scale, y // self.scale, obj))
+
+    def remove_static(self, obj):
+        index = obj.rect.x // self.bucket_width
+        bucket = [item for item in self.buckets.get(index, []) if item[3] is not obj]
+        if bucket:
+            self.buckets[index] = bucket
+        else:
+            self.buckets.pop(index, None)
+
+    def draw_background(self, target):
+        submit(target, self.background)
+
+    def draw_static(self, target, offset_x):
+        first = (offset_x - self.bucket_width) // self.bucket_width
+        last = (offset_x + self.view_width) // self.bucket_width
+        scroll = int(offset_x) // self.scale
+        for index in range(int(first), int(last) + 1):
+            bucket = self.buckets.get(index)
+            if bucket:
+                submit(target, [(image, (x - scroll, y)) for image, x, y, _ in bucket])
+
+    # Queues a moving object if any part of it is in view
+    def add_dynamic(self, image, x, y, offset_x):
+        screen_x = int(x) // self.scale - int(offset_x) // self.scale
+        if -image.get_width() < screen_x < self.view_width // self.scale:
+            self.queue.add(image, (screen_x, int(y) // self.scale))
+
+    def draw_dynamic(self, target):
+        self.queue.flush(target)
@@ -0,0 +1,93 @@
+import struct
+
+# Snapshot layout, everything a tick changes and nothing that can be rebuilt
+# camera offset, fire hits, frame number
+GAME = struct.Struct("<iii")
+# x, y, x_vel, y_vel, jump_count, fall_count, hit_count, animation_count, hit, state, facing
+PLAYER = struct.Struct("<iiifiiiiBBB")
+# active, x, y, direction (one per pooled enemy)
+ENEMY = struct.Struct("<Biib")
+# x, animation_count (one per fire trap)
+TRAP = struct.Struct("<ii")
+
+
+# Keeps the last `seconds` of game state in one preallocated ring buffer.
+# Every tick record() packs the state into the next slot, restore() jumps back
+# any number of ticks by unpacking an older slot. Memory never grows.
+class RewindBuffer:
+    def __init__(self, seconds, fps, max_enemies, max_traps):
+        self.capacity = seconds * fps
+        self.max_enemies = max_enemies
+        self.max_traps = max_traps
+        self.enemy_offset = GAME.size + PLAYER.size
+        self.trap_offset = self.enemy_offset + ENEMY.size * max_enemies
+        self.size = self.trap_offset + TRAP.size * max_traps
+        self.data = bytearray(self.capacity * self.size)
+        self.head = 0
+        self.frames = 0
+
+    def record(self, offset_x, fire_hits, frame, player, enemy_pool, fire_traps):
+        data = self.data
+        base = self.head * self.size
+        GAME.pack_into(data, base, int(offset_x), fire_hits, frame)
+        PLAYER.pack_into(data, base + GAME.size, player.rect.x, player.rect.y, player.x_vel, player.y_vel,
+                         player.jump_count, player.fall_count, player.hit_count, player.animation_count,
+                         player.hit, player.state, player.facing)
+
+        position = base + self.enemy_offset
+        for slot in range(self.max_enemies):
+            if slot < len(enemy_pool.entities):
+                enemy = enemy_pool.entities[slot]
+                ENEMY.pack_into(data, position, enemy.active, enemy.rect.x, enemy.rect.y, enemy.direction)
+            else:
+                ENEMY.pack_into(data, position, False, 0, 0, 0)
+            position += ENEMY.size
+
+        position = base + self.trap_offset
+        for slot in range(self.max_traps):
+            if slot < len(fire_traps):
+                trap = fire_traps[slot]
+                TRAP.pack_into(data, position, trap.rect.x, trap.animation_count)
+            else:
+                TRAP.pack_into(data, position, 0, -1)
+            position += TRAP.size
+
+        self.head = (self.head + 1) % self.capacity
+        self.frames = min(self.frames + 1, self.capacity)
+
+    # Goes back `ticks` ticks (at most to the oldest snapshot) and drops the newer
+    # snapshots. Returns (offset_x, fire_hits, frame) of the restored tick.
+    def restore(self, ticks, player, enemy_pool, fire_traps):
+        if self.frames == 0:
+            return None
+        ticks = min(ticks, self.frames - 1)
+        self.head = (self.head - ticks) % self.capacity
+        self.frames -= ticks
+        data = self.data
+        base = ((self.head - 1) % self.capacity) * self.size
+
+        (player.rect.x, player.rect.y, player.x_vel, player.y_vel, player.jump_count, player.fall_count,
+         player.hit_count, player.animation_count, hit, player.state, player.facing) = PLAYER.unpack_from(
+            data, base + GAME.size)
+        player.hit = bool(hit)
+
+        # Only enemies that are active now and were active then are moved back
+        position = base + self.enemy_offset
+        for enemy in enemy_pool.entities[:self.max_enemies]:
+            active, x, y, direction = ENEMY.unpack_from(data, position)
+            if active and enemy.active:
+                enemy.rect.x, enemy.rect.y = x, y
+                enemy.turn(direction)
+            position += ENEMY.size
+
+        trap_counts = {}
+        position = base + self.trap_offset
+        for _ in range(self.max_traps):
+            x, animation_count = TRAP.unpack_from(data, position)
+            if animation_count >= 0:
+                trap_counts[x] = animation_count
+            position += TRAP.size
+        for trap in fire_traps:
+            trap.animation_count = trap_counts.get(trap.rect.x, trap.animation_count)
+
+        return GAME.unpack_from(data, base)
@@ -0,0 +1,54 @@
+# Walkable segments on top of the solid tiles of a level. A segment is the run
+# of tiles at one height that can be walked along before reaching a ledge or a
+# wall, stored as the (left, right) x positions of its edges. Segments are
+# worked out once and cached, so enemies only have to clamp to them.
+class SegmentIndex:
+    def __init__(self, tile_size):
+        self.tile_size = tile_size
+        self.solid = set()
+        self.segments = {}
+
+    def add(self, x, y):
+        self.solid.add((x // self.tile_size, y))
+        self.invalidate(x // self.tile_size, y)
+
+    def remove(self, x, y):
+        self.solid.discard((x // self.tile_size, y))
+        self.invalidate(x // self.tile_size, y)
+
+    # Forgets the cached segments a changed tile can touch: the ones next to it
+    # and the one on the tile below it, which it covers or uncovers
+    def invalidate(self, column, y):
+        for row_y in (y, y + self.tile_size):
+            for near in (column - 1, column, column + 1):
+                segment = self.segments.get((near, row_y))
+                if segment:
+                    for segment_column in range(segment[0] // self.tile_size, segment[1] // self.tile_size):
+                        self.segments.pop((segment_column, row_y), None)
+
+    # A tile can be walked on when nothing solid is on top of it
+    def walkable(self, column, y):
+        return (column, y) in self.solid and (column, y - self.tile_size) not in self.solid
+
+    def segment(self, column, y):
+        key = (column, y)
+        if key in self.segments:
+            return self.segments[key]
+        if not self.walkable(column, y):
+            return None
+
+        first = column
+        while self.walkable(first - 1, y):
+            first -= 1
+        last = column
+        while self.walkable(last + 1, y):
+            last += 1
+
+        segment = (first * self.tile_size, (last + 1) * self.tile_size)
+        for column in range(first, last + 1):
+            self.segments[(column, y)] = segment
+        return segment
+
+    # Finds the segment below something standing at rect
+    def find(self, rect):
+        return self.segment(rect.centerx // self.tile_size, rect.bottom)
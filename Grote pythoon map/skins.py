@@ -0,0 +1,51 @@
+from collections import OrderedDict
+from os import listdir
+from os.path import isdir, join
+
+
+# Function to estimate how much memory a list of frames takes
+def frames_size(frames):
+    return sum(frame.image.get_width() * frame.image.get_height() * frame.image.get_bytesize()
+               for frame in frames)
+
+
+# Loads the animations of player characters on first use.
+# Every character is a folder with one sheet per animation (idle.png, run.png, ...).
+# Only the right facing frames are loaded, the left ones are flipped when first needed.
+# When the loaded frames go over the memory budget the least recently used
+# animations are dropped again and reloaded when they are needed.
+class SkinRegistry:
+    def __init__(self, root, load_sheet, flip, budget=16 * 1024 * 1024):
+        self.root = root
+        self.load_sheet = load_sheet
+        self.flip = flip
+        self.budget = budget
+        self.sheets = OrderedDict()
+        self.used = 0
+
+    def names(self):
+        return sorted(name for name in listdir(self.root) if isdir(join(self.root, name)))
+
+    def get(self, skin, animation, direction):
+        key = (skin, animation, direction)
+        frames = self.sheets.get(key)
+        if frames is not None:
+            self.sheets.move_to_end(key)
+            return frames
+
+        if direction == "left":
+            frames = self.flip(self.get(skin, animation, "right"))
+        else:
+            frames = self.load_sheet(join(self.root, skin, animation + ".png"))
+
+        self.sheets[key] = frames
+        self.used += frames_size(frames)
+        self.evict(keep=key)
+        return frames
+
+    def evict(self, keep=None):
+        for key in list(self.sheets):
+            if self.used <= self.budget:
+                break
+            if key != keep:
+                self.used -= frames_size(self.sheets.pop(key))
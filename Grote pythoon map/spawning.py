@@ -0,0 +1,61 @@
+# Keeps entities that are not in use so they can be handed out again
+# instead of creating new ones. At most `size` entities ever exist.
+# entity.active tells if an entity is handed out.
+class EntityPool:
+    def __init__(self, create, size):
+        self.create = create
+        self.size = size
+        self.entities = []
+        self.free = []
+
+    def acquire(self):
+        if self.free:
+            entity = self.free.pop()
+        elif len(self.entities) < self.size:
+            entity = self.create()
+            self.entities.append(entity)
+        else:
+            return None
+        entity.active = True
+        return entity
+
+    def release(self, entity):
+        entity.active = False
+        self.free.append(entity)
+
+
+# Activates entities from a pool when the camera comes within `margin` of their
+# spawn point and gives them back once they are further than `despawn_margin`
+# outside the view. Spawn points are (x, y) tuples that come from the level
+# source through source.spawn_points(left, right).
+class Spawner:
+    def __init__(self, source, pool, margin=200, despawn_margin=600):
+        self.source = source
+        self.pool = pool
+        self.margin = margin
+        self.despawn_margin = despawn_margin
+        self.active = {}
+
+    # Returns the lists of entities that were spawned and despawned
+    def update(self, offset_x, view_width):
+        despawned = []
+        left = offset_x - self.despawn_margin
+        right = offset_x + view_width + self.despawn_margin
+        for point, entity in list(self.active.items()):
+            if entity.rect.right < left or entity.rect.left > right:
+                del self.active[point]
+                self.pool.release(entity)
+                despawned.append(entity)
+
+        spawned = []
+        for point in self.source.spawn_points(offset_x - self.margin, offset_x + view_width + self.margin):
+            if point in self.active:
+                continue
+            entity = self.pool.acquire()
+            if entity is None:
+                break
+            entity.reset(*point)
+            self.active[point] = entity
+            spawned.append(entity)
+
+        return spawned, despawned
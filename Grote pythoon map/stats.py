@@ -0,0 +1,129 @@
+import queue
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    level TEXT NOT NULL,
+    started REAL NOT NULL,
+    duration REAL NOT NULL,
+    outcome TEXT NOT NULL,
+    jumps INTEGER NOT NULL,
+    fire_hits INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS deaths (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    cause TEXT NOT NULL,
+    x INTEGER NOT NULL,
+    y INTEGER NOT NULL,
+    time REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_level ON runs(level, outcome, duration);
+CREATE INDEX IF NOT EXISTS deaths_run ON deaths(run_id);
+"""
+
+
+# Counts what happens during one run, only touched by the game loop
+class RunStats:
+    def __init__(self, level):
+        self.level = level
+        self.started = time.time()
+        self.jumps = 0
+        self.fire_hits = 0
+        self.deaths = []
+
+    def death(self, cause, x, y):
+        self.deaths.append((cause, int(x), int(y), time.time() - self.started))
+
+
+# Stores finished runs in a SQLite database. record() only puts the run in a
+# queue, a background thread writes everything queued in one transaction when
+# flush() is called or every `flush_interval` seconds.
+class StatsStore:
+    def __init__(self, path="stats.db", flush_interval=5.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.pending = queue.Queue()
+        self.flush_now = threading.Event()
+        self.running = True
+        self.ready = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="stats", daemon=True)
+        self.thread.start()
+
+    def record(self, run, outcome):
+        duration = time.time() - run.started
+        self.pending.put(((run.level, run.started, duration, outcome, run.jumps, run.fire_hits), run.deaths))
+
+    def flush(self):
+        self.flush_now.set()
+
+    def close(self, timeout=2.0):
+        self.running = False
+        self.flush_now.set()
+        self.thread.join(timeout)
+
+    def _run(self):
+        connection = sqlite3.connect(self.path)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(SCHEMA)
+        self.ready.set()
+        while self.running:
+            self.flush_now.wait(self.flush_interval)
+            self.flush_now.clear()
+            self._write(connection)
+        self._write(connection)
+        connection.close()
+
+    def _write(self, connection):
+        batch = []
+        while True:
+            try:
+                batch.append(self.pending.get_nowait())
+            except queue.Empty:
+                break
+        if not batch:
+            return
+        with connection:
+            for run, deaths in batch:
+                run_id = connection.execute(
+                    "INSERT INTO runs (level, started, duration, outcome, jumps, fire_hits)"
+                    " VALUES (?, ?, ?, ?, ?, ?)", run).lastrowid
+                connection.executemany("INSERT INTO deaths (run_id, cause, x, y, time) VALUES (?, ?, ?, ?, ?)",
+                                       [(run_id, *death) for death in deaths])
+
+    # Queries open their own connection, so they can run next to the writer
+    def query(self, sql, parameters=()):
+        self.ready.wait()
+        connection = sqlite3.connect(self.path)
+        try:
+            return connection.execute(sql, parameters).fetchall()
+        finally:
+            connection.close()
+
+    # Fastest finished runs of a level: (duration, jumps, deaths, started)
+    def leaderboard(self, level, limit=10):
+        return self.query(
+            "SELECT duration, jumps, (SELECT COUNT(*) FROM deaths WHERE run_id = runs.id), started"
+            " FROM runs WHERE level = ? AND outcome = 'finish' ORDER BY duration LIMIT ?", (level, limit))
+
+    # Number of deaths per cause in buckets of `bucket_width` pixels: (bucket x, cause, count)
+    def death_heatmap(self, level, bucket_width=96):
+        return self.query(
+            "SELECT (deaths.x / ?) * ?, cause, COUNT(*) FROM deaths JOIN runs ON runs.id = deaths.run_id"
+            " WHERE runs.level = ? GROUP BY 1, 2 ORDER BY 1, 2", (bucket_width, bucket_width, level))
+
+
+if __name__ == "__main__":
+    import sys
+
+    store = StatsStore(sys.argv[2] if len(sys.argv) > 2 else "stats.db")
+    level = sys.argv[1] if len(sys.argv) > 1 else "level1"
+    print("Fastest runs on", level)
+    for duration, jumps, deaths, _ in store.leaderboard(level):
+        print("  %6.1f s  %3d jumps  %2d deaths" % (duration, jumps, deaths))
+    print("Deaths by position")
+    for x, cause, count in store.death_heatmap(level):
+        print("  x=%5d  %-6s %s" % (x, cause, "#" * count))
+    store.close()
@@ -0,0 +1,166 @@
+import queue
+import threading
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ThreadPoolExecutor
+
+import pygame
+
+
+# Decodes images on worker threads and keeps the converted surfaces.
+# prefetch() starts loading in the background, image() waits for the result.
+class AssetLoader:
+    def __init__(self, workers=4):
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="assets")
+        self.lock = threading.Lock()
+        self.futures = {}
+
+    def prefetch(self, path):
+        with self.lock:
+            future = self.futures.get(path)
+            if future is None:
+                future = self.pool.submit(self._decode, path)
+                self.futures[path] = future
+        return future
+
+    def image(self, path):
+        return self.prefetch(path).result()
+
+    # Forgets a decoded image once only the parts cut out of it are used
+    def release(self, path):
+        with self.lock:
+            self.futures.pop(path, None)
+
+    # Forgets every decoded image, the next image() call decodes it again
+    def clear(self):
+        with self.lock:
+            self.futures.clear()
+
+    def _decode(self, path):
+        image = pygame.image.load(path)
+        if pygame.display.get_surface() is None:
+            return image  # No window yet (tools, tests), keep the image unconverted
+        return image.convert_alpha()
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+# Groups level tiles ("block", x, y) by the chunk their x position falls in
+# and keeps the (x, y) enemy spawn points sorted by x
+class LevelSource:
+    def __init__(self, tiles, chunk_width, spawn_points=()):
+        self.chunk_width = chunk_width
+        self.chunks = {}
+        for tile in tiles:
+            self.chunks.setdefault(tile[1] // chunk_width, []).append(tile)
+        self.points = sorted(spawn_points)
+        self.xs = [x for x, _ in self.points]
+
+    def has_chunk(self, index):
+        return index in self.chunks
+
+    def tiles(self, index):
+        return self.chunks.get(index, [])
+
+    def spawn_points(self, left, right):
+        return self.points[bisect_left(self.xs, left):bisect_right(self.xs, right)]
+
+
+# Builds the objects of level chunks on a worker thread ahead of the camera.
+# Finished chunks go through a queue and are picked up by update() on the main thread.
+class ChunkStreamer:
+    def __init__(self, source, build, chunk_width, ahead=1, workers=2):
+        self.source = source
+        self.build = build
+        self.chunk_width = chunk_width
+        self.ahead = ahead
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chunks")
+        self.finished = queue.Queue()
+        self.requested = set()
+        self.chunks = {}
+
+    def visible_range(self, offset_x, view_width):
+        first = offset_x // self.chunk_width - self.ahead
+        last = (offset_x + view_width) // self.chunk_width + self.ahead
+        return range(int(first), int(last) + 1)
+
+    def request(self, index):
+        if index in self.requested or not self.source.has_chunk(index):
+            return
+        self.requested.add(index)
+        self.pool.submit(self._build, index)
+
+    def _build(self, index):
+        try:
+            self.finished.put((index, self.build(self.source.tiles(index)), None))
+        except Exception as error:
+            self.finished.put((index, None, error))
+
+    def request_view(self, offset_x, view_width):
+        for index in self.visible_range(offset_x, view_width):
+            self.request(index)
+
+    # Requests the chunks around the camera and returns the objects of every
+    # chunk that finished since the last call, never waits for a worker
+    def update(self, offset_x, view_width):
+        self.request_view(offset_x, view_width)
+
+        added = []
+        while True:
+            try:
+                index, objects, error = self.finished.get_nowait()
+            except queue.Empty:
+                break
+            if error:
+                raise error
+            self.chunks[index] = objects
+            added.extend(objects)
+        return added
+
+    # Forgets the chunks more than `keep` chunks outside the view and returns
+    # their objects, so memory stays the same however far the camera moves
+    def discard(self, offset_x, view_width, keep=2):
+        visible = self.visible_range(offset_x, view_width)
+        removed = []
+        for index in list(self.chunks):
+            if index < visible.start - keep or index >= visible.stop + keep:
+                removed.extend(self.chunks.pop(index))
+                self.requested.discard(index)
+        return removed
+
+    # Switches to a changed version of the level. Objects whose tile was removed
+    # are taken out of the loaded chunks, added tiles that fall in a loaded chunk
+    # are built right away. Returns (added objects, removed objects).
+    def reload(self, source, added_tiles, removed_tiles, tile_of):
+        self.source = source
+        removed = []
+        for objects in self.chunks.values():
+            keep = []
+            for obj in objects:
+                (removed if tile_of(obj) in removed_tiles else keep).append(obj)
+            objects[:] = keep
+
+        added = []
+        for tile in added_tiles:
+            index = tile[1] // self.chunk_width
+            if index in self.chunks:
+                new_objects = self.build([tile])
+                self.chunks[index].extend(new_objects)
+                added.extend(new_objects)
+        return added, removed
+
+    # Blocks until the chunks in view are built, only used before the first frame
+    def wait_for_view(self, offset_x, view_width):
+        needed = [index for index in self.visible_range(offset_x, view_width)
+                  if self.source.has_chunk(index)]
+        added = self.update(offset_x, view_width)
+        while any(index not in self.chunks for index in needed):
+            index, objects, error = self.finished.get()
+            if error:
+                raise error
+            self.chunks[index] = objects
+            added.extend(objects)
+        return added
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,183 @@
+import os
+import queue
+import random
+import socket
+import struct
+import sys
+import threading
+import time
+
+# Record types, every record starts with one of these bytes
+RECORD_TICK = 1
+RECORD_DEATH = 2
+RECORD_FINISH = 3
+
+# Causes used in death records
+CAUSE_ENEMY = 1
+CAUSE_FIRE = 2
+CAUSE_FALL = 3
+CAUSE_NAMES = {CAUSE_ENEMY: "enemy", CAUSE_FIRE: "fire", CAUSE_FALL: "fall"}
+
+# Binary layouts (little endian)
+# batch header: session id, batch sequence number, record count
+HEADER = struct.Struct("<IIH")
+# tick: type, frame, x, y, x_vel, y_vel, frame time in ms
+TICK = struct.Struct("<BIiifff")
+# death / finish: type, frame, cause, x, y
+EVENT = struct.Struct("<BIBii")
+
+RECORDS = {RECORD_TICK: TICK, RECORD_DEATH: EVENT, RECORD_FINISH: EVENT}
+
+# Keep every batch below a typical MTU so a datagram is never fragmented
+MAX_DATAGRAM = 1400
+
+
+# Turns "udp:host:port" or "unix:/path/to.sock" into a socket address
+def parse_address(text):
+    kind, _, rest = text.partition(":")
+    if kind == "unix":
+        return rest
+    if kind == "udp":
+        host, _, port = rest.rpartition(":")
+        return (host or "127.0.0.1", int(port))
+    raise ValueError("telemetry address must look like udp:host:port or unix:/path")
+
+
+def make_socket(address):
+    family = socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+    return socket.socket(family, socket.SOCK_DGRAM)
+
+
+# Sends per-tick game state in batches from a background thread.
+# The game thread only packs a record and puts it in a bounded queue,
+# when the queue is full the record is dropped instead of waiting.
+class TelemetryEmitter:
+    def __init__(self, address, batch_size=50, max_queue=2048, flush_interval=0.25):
+        self.address = address
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.records = queue.Queue(maxsize=max_queue)
+        self.session = random.getrandbits(32)
+        self.sequence = 0
+        self.dropped = 0
+        self.send_errors = 0
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="telemetry", daemon=True)
+        self.thread.start()
+
+    def tick(self, frame, x, y, x_vel, y_vel, frame_ms):
+        self._put(TICK.pack(RECORD_TICK, frame, int(x), int(y), x_vel, y_vel, frame_ms))
+
+    def death(self, frame, cause, x, y):
+        self._put(EVENT.pack(RECORD_DEATH, frame, cause, int(x), int(y)))
+
+    def finish(self, frame, x, y):
+        self._put(EVENT.pack(RECORD_FINISH, frame, 0, int(x), int(y)))
+
+    def _put(self, record):
+        try:
+            self.records.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, timeout=1.0):
+        self.running = False
+        self.thread.join(timeout)
+
+    def _run(self):
+        sock = make_socket(self.address)
+        batch = []
+        size = HEADER.size
+        deadline = time.monotonic() + self.flush_interval
+
+        while self.running or not self.records.empty():
+            try:
+                record = self.records.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                record = None
+
+            if record is not None:
+                if size + len(record) > MAX_DATAGRAM:
+                    self._send(sock, batch)
+                    batch, size = [], HEADER.size
+                batch.append(record)
+                size += len(record)
+
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                self._send(sock, batch)
+                batch, size = [], HEADER.size
+                deadline = time.monotonic() + self.flush_interval
+
+        self._send(sock, batch)
+        sock.close()
+
+    def _send(self, sock, batch):
+        if not batch:
+            return
+        data = HEADER.pack(self.session, self.sequence, len(batch)) + b"".join(batch)
+        self.sequence += 1
+        try:
+            sock.sendto(data, self.address)
+        except OSError:
+            # Nobody is listening, telemetry is best effort
+            self.send_errors += 1
+
+
+# Splits a received datagram back into (session, sequence, records)
+def decode_batch(data):
+    session, sequence, count = HEADER.unpack_from(data)
+    offset = HEADER.size
+    records = []
+    for _ in range(count):
+        layout = RECORDS[data[offset]]
+        records.append(layout.unpack_from(data, offset))
+        offset += layout.size
+    return session, sequence, records
+
+
+# Tiny local collector for testing, prints a summary every second
+def run_collector(address, handler=None):
+    sock = make_socket(address)
+    if isinstance(address, str) and os.path.exists(address):
+        os.remove(address)
+    sock.bind(address)
+    print("Collecting telemetry on", address)
+
+    last_sequence = {}
+    ticks = 0
+    lost = 0
+    report_time = time.monotonic() + 1
+    try:
+        while True:
+            session, sequence, records = decode_batch(sock.recv(65536))
+            if session in last_sequence:
+                lost += max(0, sequence - last_sequence[session] - 1)
+            last_sequence[session] = sequence
+
+            for record in records:
+                if handler:
+                    handler(session, record)
+                if record[0] == RECORD_TICK:
+                    ticks += 1
+                    last_tick = record
+                elif record[0] == RECORD_DEATH:
+                    print("[%08x] frame %d: died (%s) at x=%d y=%d"
+                          % (session, record[1], CAUSE_NAMES.get(record[2], "?"), record[3], record[4]))
+                elif record[0] == RECORD_FINISH:
+                    print("[%08x] frame %d: reached the finish at x=%d" % (session, record[1], record[3]))
+
+            if time.monotonic() >= report_time and ticks:
+                print("%d ticks/s, %d lost batches, last pos (%d, %d), frame %.1f ms"
+                      % (ticks, lost, last_tick[2], last_tick[3], last_tick[6]))
+                ticks = 0
+                report_time = time.monotonic() + 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sock.close()
+        if isinstance(address, str) and os.path.exists(address):
+            os.remove(address)
+
+
+if __name__ == "__main__":
+    run_collector(parse_address(sys.argv[1] if len(sys.argv) > 1 else "udp:127.0.0.1:9999"))
@@ -0,0 +1,388 @@
+# Many games at once without a window, for bots that learn or test the level.
+# Every instance is a row in NumPy arrays, so one step() moves all of them:
+#
+#   env = VecEnv(256, seed=1)
+#   observations = env.reset()
+#   observations, rewards, done = env.step(actions)   # actions: one int per instance
+#
+# The rules are the ones of the game: gravity and jumping from Player.loop,
+# blocking and landing from handle_move, enemies walking their segment, two fire
+# hits or touching an enemy is death and touching the flag finishes the level.
+# Terrain is a grid of solid tiles, enemies and fire traps are solid boxes like
+# in the game. Hitboxes follow the animation frames like in the game. An
+# instance that is done starts over on the next step.
+#
+# It follows the game closely but not exactly. The pixel masks of irregular
+# frames (the enemies) are not used, landing in a stack of tiles snaps to one
+# tile instead of going through them one by one like handle_vertical_collision,
+# and the game checks objects in the order their chunks finished building.
+import numpy as np
+
+import Platerformer as game
+import level1
+from frames import compile_animations, LEFT, RIGHT, IDLE, RUN, JUMP, DOUBLE_JUMP, FALL, HIT, ON, PLAYER_STATES
+from render import Renderer
+from segments import SegmentIndex
+
+# Actions are bit flags, e.g. ACTION_RIGHT | ACTION_JUMP
+ACTION_LEFT = 1
+ACTION_RIGHT = 2
+ACTION_JUMP = 4
+
+BLOCK_SIZE = 96
+PROGRESS_REWARD = 0.01  # For every pixel further right than the instance has been
+FINISH_REWARD = 10.0
+DEATH_PENALTY = 1.0
+VIEW_COLUMNS = np.arange(-2, 6)  # Terrain columns around the player put in the observation
+SCROLL_AREA = 200  # Same camera rule as main(), only used for rendering
+
+# Observation: x, y, x_vel, y_vel, jump_count, fire_hits, nearest enemy dx, dy,
+# then the solid tiles of VIEW_COLUMNS from top to bottom
+PLAYER_VALUES = 8
+
+
+# Function to round like pygame.Rect does when a float is added to it
+def round_away(values):
+    return np.where(values >= 0, np.floor(values + 0.5), np.ceil(values - 0.5))
+
+
+# Function to check which boxes overlap, like Rect.colliderect. Arrays broadcast.
+def overlap(left, top, width, height, other_left, other_top, other_width, other_height):
+    return ((left < other_left + other_width) & (other_left < left + width)
+            & (top < other_top + other_height) & (other_top < top + height))
+
+
+class VecEnv:
+    def __init__(self, count, level=level1, seed=None, max_steps=game.FPS * 120, skin=game.PLAYER_SKIN):
+        self.count = count
+        self.level = level
+        self.max_steps = max_steps
+        self.skin = skin
+        self.rng = np.random.default_rng(seed)
+        self.tiles = game.load_level(level, BLOCK_SIZE)
+
+        # Solid tiles as a grid, row 0 starts two tiles above the highest block
+        blocks = [(x, y) for kind, x, y in self.tiles if kind == "block"]
+        self.grid_x = min(x for x, _ in blocks)
+        self.grid_y = min(y for _, y in blocks) - BLOCK_SIZE * 2
+        columns = (max(x for x, _ in blocks) - self.grid_x) // BLOCK_SIZE + 1
+        rows = (max(y for _, y in blocks) - self.grid_y) // BLOCK_SIZE + 1
+        self.grid = np.zeros((rows, columns), bool)
+        for x, y in blocks:
+            self.grid[(y - self.grid_y) // BLOCK_SIZE, (x - self.grid_x) // BLOCK_SIZE] = True
+
+        # Player hitboxes of every frame of the animation table: state, direction, frame -> x, y, width, height
+        animations = compile_animations(
+            lambda name, direction: game.standing_frames(game.skins.get(skin, name, direction)), PLAYER_STATES)
+        self.frame_counts = np.array([len(frames) for frames, _ in animations])
+        self.player_boxes = np.zeros((len(animations), 2, self.frame_counts.max(), 4), np.int64)
+        for state, directions in enumerate(animations):
+            for direction, frames in enumerate(directions):
+                self.player_boxes[state, direction, :len(frames)] = [tuple(frame.hitbox) for frame in frames]
+        self.player_size = game.world_rect(animations[IDLE][RIGHT][0].image, 0, 0).size
+
+        # Fire hitboxes change with the animation, so one cycle of Fire.loop() is
+        # recorded. Row 0 is the hitbox before the first loop, row 1 + n after n loops.
+        fires = game.build_objects([tile for tile in self.tiles if tile[0] == "fire"], BLOCK_SIZE)
+        self.fire_x = np.array([fire.rect.x for fire in fires])
+        self.fire_y = np.array([fire.rect.y for fire in fires])
+        fire = game.build_objects([("fire", 0, 0)], BLOCK_SIZE)[0]
+        self.fire_period = len(fire.animations[ON][RIGHT]) * fire.ANIMATION_DELAY
+        boxes = [tuple(fire.box)]
+        for _ in range(self.fire_period):
+            fire.loop()
+            boxes.append(tuple(fire.box))
+        self.fire_boxes = np.array(boxes)
+
+        _, flag_x, flag_y = next(tile for tile in self.tiles if tile[0] == "flag")
+        self.flag_rect = game.Flag(flag_x, flag_y, 50, 100).rect
+
+        # Enemies walk the segment below their spawn point, like update_enemies() does
+        segments = SegmentIndex(BLOCK_SIZE)
+        for x, y in blocks:
+            segments.add(x, y)
+        enemy = game.MovingEnemy(0, 0, 32, 32, game.ENEMY_VEL)
+        self.enemy_box = enemy.box
+        self.spawn_points = game.load_spawn_points(level, BLOCK_SIZE)
+        lefts, rights = [], []
+        for x, y in self.spawn_points:
+            enemy.reset(x, y)
+            enemy.patrol(segments.find(enemy.rect))
+            lefts.append(enemy.left)
+            rights.append(enemy.right)
+        self.enemy_left = np.array(lefts, np.int64)
+        self.enemy_right = np.maximum(self.enemy_left, rights)
+        self.enemy_top = np.array([y for _, y in self.spawn_points], np.int64) + self.enemy_box.y
+
+        enemies = len(self.spawn_points)
+        self.x = np.zeros(count, np.int64)
+        self.y = np.zeros(count, np.int64)
+        self.x_vel = np.zeros(count, np.int64)
+        self.y_vel = np.zeros(count)
+        self.fall_count = np.zeros(count, np.int64)
+        self.jump_count = np.zeros(count, np.int64)
+        self.hit = np.zeros(count, bool)
+        self.hit_count = np.zeros(count, np.int64)
+        self.state = np.zeros(count, np.int64)
+        self.direction = np.zeros(count, np.int64)
+        self.animation_count = np.zeros(count, np.int64)
+        self.box = np.zeros((count, 4), np.int64)
+        self.fire_hits = np.zeros(count, np.int64)
+        self.steps = np.zeros(count, np.int64)
+        self.best_x = np.zeros(count, np.int64)
+        self.offset_x = np.zeros(count, np.int64)
+        self.enemy_x = np.zeros((count, enemies), np.int64)
+        self.enemy_direction = np.zeros((count, enemies), np.int64)
+        self.scene = None
+        self.reset()
+
+    # Function to put instances back at the start, all of them when `which` is None
+    def reset(self, which=None):
+        if which is None:
+            which = np.ones(self.count, bool)
+        self.x[which] = 100
+        self.y[which] = 100
+        self.x_vel[which] = 0
+        self.y_vel[which] = 0
+        self.fall_count[which] = 0
+        self.jump_count[which] = 0
+        self.hit[which] = False
+        self.hit_count[which] = 0
+        self.state[which] = IDLE
+        self.direction[which] = LEFT
+        self.animation_count[which] = 0
+        self.box[which] = (0, 0, *self.player_size)  # A new Player has no frame yet
+        self.fire_hits[which] = 0
+        self.steps[which] = 0
+        self.best_x[which] = 100
+        self.offset_x[which] = 0
+        self.enemy_x[which] = [x for x, _ in self.spawn_points]
+        self.enemy_direction[which] = self.rng.choice([-1, 1], (int(np.count_nonzero(which)), len(self.spawn_points)))
+        return self.observe()
+
+    # Solid tiles at world positions, outside the grid is empty
+    def solid(self, x, y):
+        column = (x - self.grid_x) // BLOCK_SIZE
+        row = (y - self.grid_y) // BLOCK_SIZE
+        rows, columns = self.grid.shape
+        inside = (column >= 0) & (column < columns) & (row >= 0) & (row < rows)
+        return inside & self.grid[np.clip(row, 0, rows - 1), np.clip(column, 0, columns - 1)]
+
+    # Function to check player hitboxes against the grid. A hitbox is smaller than
+    # a tile, so it can only touch the tiles under its four corners.
+    def hits_terrain(self, left, top):
+        right = left + self.box[:, 2] - 1
+        bottom = top + self.box[:, 3] - 1
+        return self.solid(left, top) | self.solid(right, top) | self.solid(left, bottom) | self.solid(right, bottom)
+
+    # Fire trap hitboxes of every instance, the traps have done `loops` animation steps
+    def fire_hitboxes(self, loops):
+        x, y, width, height = self.fire_boxes[np.where(loops > 0, 1 + (loops - 1) % self.fire_period, 0)].T
+        return self.fire_x + x[:, None], self.fire_y + y[:, None], width[:, None], height[:, None]
+
+    # Which player hitboxes overlap a fire trap or an enemy, per trap and per enemy
+    def hits_boxes(self, left, top, fire_boxes):
+        width = self.box[:, 2:3]
+        height = self.box[:, 3:4]
+        fires = overlap(left[:, None], top[:, None], width, height, *fire_boxes)
+        enemies = overlap(left[:, None], top[:, None], width, height, self.enemy_x + self.enemy_box.x,
+                          self.enemy_top, self.enemy_box.width, self.enemy_box.height)
+        return fires, enemies
+
+    # Player.update_sprite: pick the animation and frame, only its hitbox is kept.
+    # A new state starts its animation from the first frame, like Animated.set_animation.
+    def update_sprite(self):
+        state = np.full(self.count, IDLE)
+        state[self.x_vel != 0] = RUN
+        state[self.y_vel > game.Player.GRAVITY * 2] = FALL
+        rising = self.y_vel < 0
+        state[rising & (self.jump_count == 1)] = JUMP
+        state[rising & (self.jump_count == 2)] = DOUBLE_JUMP
+        state[self.hit] = HIT
+        self.animation_count[state != self.state] = 0
+        self.state = state
+        frame = (self.animation_count // game.Player.ANIMATION_DELAY) % self.frame_counts[state]
+        self.box = self.player_boxes[state, self.direction, frame]
+        self.animation_count += 1
+
+    def step(self, actions):
+        actions = np.asarray(actions)
+
+        # Fire traps count a hit every tick the player is within FIRE_REACH of them, two hits is death
+        reach = game.FIRE_REACH
+        fires = overlap((self.x + self.box[:, 0] - reach)[:, None], (self.y + self.box[:, 1] - 1)[:, None],
+                        (self.box[:, 2] + reach * 2)[:, None], (self.box[:, 3] + 2)[:, None],
+                        *self.fire_hitboxes(self.steps))
+        self.fire_hits += fires.sum(axis=1)
+        died = self.fire_hits >= 2
+
+        # Player.jump
+        jump = (actions & ACTION_JUMP != 0) & (self.jump_count < 2)
+        self.y_vel[jump] = -game.Player.GRAVITY * 8
+        self.animation_count[jump] = 0
+        self.jump_count[jump] += 1
+        self.fall_count[jump & (self.jump_count == 1)] = 0
+
+        # Player.loop
+        self.y_vel += np.minimum(1, self.fall_count / game.FPS * game.Player.GRAVITY)
+        self.x += self.x_vel
+        self.y = round_away(self.y + self.y_vel).astype(np.int64)
+        self.hit_count[self.hit] += 1
+        recovered = self.hit_count > game.FPS * 2
+        self.hit[recovered] = False
+        self.hit_count[recovered] = 0
+        self.fall_count += 1
+        self.update_sprite()
+        fire_boxes = self.fire_hitboxes(self.steps + 1)
+
+        # MovingEnemy.move
+        self.enemy_x += self.enemy_direction * game.ENEMY_VEL
+        at_left = self.enemy_x <= self.enemy_left
+        at_right = self.enemy_x >= self.enemy_right
+        self.enemy_x = np.clip(self.enemy_x, self.enemy_left, self.enemy_right)
+        self.enemy_direction[at_left] = 1
+        self.enemy_direction[at_right & ~at_left] = -1
+
+        # handle_move: look one step ahead and 1 pixel up on both sides before
+        # walking. collide() only returns the first object it hits and a level lists
+        # its blocks before its fire traps, so a block in the way hides a fire trap.
+        left = self.x + self.box[:, 0]
+        top = self.y + self.box[:, 1]
+        blocked = []
+        touched_fire = np.zeros(self.count, bool)
+        for dx in (-game.PLAYER_VEL * 2, game.PLAYER_VEL * 2):
+            fires, enemies = self.hits_boxes(left + dx, top - 1, fire_boxes)
+            terrain = self.hits_terrain(left + dx, top - 1)
+            blocked.append(terrain | fires.any(axis=1) | enemies.any(axis=1))
+            touched_fire |= fires.any(axis=1) & ~terrain
+        self.x_vel[:] = 0
+        self.move((actions & ACTION_LEFT != 0) & ~blocked[0], LEFT)
+        self.move((actions & ACTION_RIGHT != 0) & ~blocked[1], RIGHT)
+
+        touched_fire |= self.vertical_collision(left, top, fire_boxes)
+        self.hit |= touched_fire
+
+        # Camera scrolling, same rule as main()
+        screen_x = self.x - self.offset_x
+        scroll = (((screen_x + self.player_size[0] >= game.WIDTH - SCROLL_AREA) & (self.x_vel > 0))
+                  | ((screen_x <= SCROLL_AREA) & (self.x_vel < 0)))
+        self.offset_x[scroll] += self.x_vel[scroll]
+
+        finished = overlap(self.x, self.y, self.player_size[0], self.player_size[1], *self.flag_rect)
+        _, enemies = self.hits_boxes(self.x + self.box[:, 0], self.y + self.box[:, 1], fire_boxes)
+        died |= enemies.any(axis=1) | (self.y > game.FALL_LIMIT)
+        died &= ~finished
+
+        rewards = (np.maximum(self.x, self.best_x) - self.best_x) * PROGRESS_REWARD
+        rewards += finished * FINISH_REWARD - died * DEATH_PENALTY
+        self.best_x = np.maximum(self.x, self.best_x)
+        self.steps += 1
+        done = died | finished | (self.steps >= self.max_steps)
+        if done.any():
+            self.reset(done)
+        return self.observe(), rewards, done
+
+    # Player.move_left / move_right, turning around restarts the animation
+    def move(self, which, direction):
+        self.x_vel[which] = game.PLAYER_VEL if direction == RIGHT else -game.PLAYER_VEL
+        turned = which & (self.direction != direction)
+        self.direction[turned] = direction
+        self.animation_count[turned] = 0
+
+    # handle_vertical_collision: falling lands on top of what was hit, rising
+    # bounces off it. Returns which players touched a fire trap.
+    def vertical_collision(self, left, top, fire_boxes):
+        height = self.box[:, 3]
+        bottom = top + height - 1
+        right = left + self.box[:, 2] - 1
+        bottom_row = self.solid(left, bottom) | self.solid(right, bottom)
+        top_row = self.solid(left, top) | self.solid(right, top)
+        bottom_tile = (bottom - self.grid_y) // BLOCK_SIZE * BLOCK_SIZE + self.grid_y
+        top_tile = (top - self.grid_y) // BLOCK_SIZE * BLOCK_SIZE + self.grid_y
+
+        falling = self.y_vel > 0
+        rising = self.y_vel < 0
+        land = falling & (bottom_row | top_row)
+        top = np.where(land, np.where(bottom_row, bottom_tile, top_tile) - height, top)
+        bump = rising & (bottom_row | top_row)
+        top = np.where(bump, np.where(top_row, top_tile, bottom_tile) + BLOCK_SIZE, top)
+
+        # Fire traps and enemies are solid too
+        fires, enemies = self.hits_boxes(left, top, fire_boxes)
+        _, fire_tops, _, fire_heights = fire_boxes
+        highest = np.iinfo(np.int64).max
+        box_top = np.minimum(np.where(fires, fire_tops, highest).min(axis=1, initial=highest),
+                             np.where(enemies, self.enemy_top, highest).min(axis=1, initial=highest))
+        box_bottom = np.maximum(np.where(fires, fire_tops + fire_heights, 0).max(axis=1, initial=0),
+                                np.where(enemies, self.enemy_top + self.enemy_box.height, 0).max(axis=1, initial=0))
+        hit_box = fires.any(axis=1) | enemies.any(axis=1)
+        top = np.where(falling & hit_box, box_top - height, top)
+        top = np.where(rising & hit_box, box_bottom, top)
+        land |= falling & hit_box
+        bump |= rising & hit_box
+
+        self.y = top - self.box[:, 1]
+        self.fall_count[land] = 0
+        self.y_vel[land] = 0
+        self.jump_count[land] = 0
+        self.y_vel[bump] *= -1
+        return fires.any(axis=1) & (falling | rising)
+
+    def observe(self):
+        count = self.count
+        observations = np.zeros((count, PLAYER_VALUES + len(VIEW_COLUMNS) * self.grid.shape[0]), np.float32)
+        observations[:, 0] = self.x
+        observations[:, 1] = self.y
+        observations[:, 2] = self.x_vel
+        observations[:, 3] = self.y_vel
+        observations[:, 4] = self.jump_count
+        observations[:, 5] = self.fire_hits
+        if self.enemy_x.shape[1]:
+            dx = self.enemy_x - self.x[:, None]
+            nearest = np.abs(dx).argmin(axis=1)
+            observations[:, 6] = dx[np.arange(count), nearest]
+            observations[:, 7] = self.enemy_top[nearest] - self.enemy_box.y - self.y
+        else:
+            observations[:, 6:8] = game.WIDTH
+
+        rows, columns = self.grid.shape
+        column = (self.x + self.player_size[0] // 2 - self.grid_x) // BLOCK_SIZE
+        view = column[:, None] + VIEW_COLUMNS
+        inside = (view >= 0) & (view < columns)
+        tiles = self.grid[:, np.clip(view, 0, columns - 1)] & inside  # rows x count x columns
+        observations[:, PLAYER_VALUES:] = tiles.transpose(1, 0, 2).reshape(count, -1)
+        return observations
+
+    # Function to draw one instance with the game's own draw(), opens the window on first use
+    def render(self, index=0):
+        window = game.init_display()
+        if self.scene is None:
+            renderer = Renderer(game.WIDTH, game.HEIGHT, game.MASK_SCALE)
+            background, bg_image = game.get_background("Blue.png")
+            renderer.set_background(bg_image, background)
+            objects = game.build_objects(self.tiles, BLOCK_SIZE)
+            for obj in objects:
+                if obj.name != "fire":
+                    renderer.add_static(obj)
+            fires = [obj for obj in objects if obj.name == "fire"]
+            enemies = [game.MovingEnemy(x, y, 32, 32, game.ENEMY_VEL) for x, y in self.spawn_points]
+            self.scene = renderer, game.Player(100, 100, 50, 50, self.skin), fires, enemies
+
+        renderer, player, fires, enemies = self.scene
+        player.x_vel, player.y_vel = int(self.x_vel[index]), float(self.y_vel[index])
+        player.jump_count = int(self.jump_count[index])
+        player.hit = bool(self.hit[index])
+        player.state = int(self.state[index])
+        player.facing = int(self.direction[index])
+        player.animation_count = max(0, int(self.animation_count[index]) - 1)
+        player.update_sprite()
+        player.rect.topleft = (int(self.x[index]), int(self.y[index]))
+        loops = int(self.steps[index])
+        for fire in fires:
+            if loops:
+                fire.animation_count = (loops - 1) % self.fire_period
+                fire.loop()
+        for enemy, x in zip(enemies, self.enemy_x[index]):
+            enemy.rect.x = int(x)
+        game.draw(window, renderer, player, fires + enemies, None, int(self.offset_x[index]))
+        return window